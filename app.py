@@ -1,17 +1,13 @@
 import os
-import json
-import math
-import time
+import logging
+import threading
+import shutil
+import hashlib
+import tempfile
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
 import requests
-import folium
-import osmnx as ox
-import geopandas as gpd
-import pandas as pd
-from shapely.geometry import Point, LineString
-from shapely.ops import transform
-import pyproj
 from io import BytesIO
 from dotenv import load_dotenv
 
@@ -20,6 +16,15 @@ load_dotenv()
 
 # Konfiguration importieren
 from config import config
+from places_client import PlacesClient
+from places_cache import PlacesCache
+from jobs import JobManager, job_key
+from batch import read_sites, geocode_sites, run_batch, write_outputs
+from geocode_cache import GeocodeCache, normalize_address
+from usage_store import UsageStore
+from result_store import ResultStore
+from metrics import Metrics, profiled
+from exporter import EXPORT_COLUMNS, EXPORT_FORMATS, unique_markets, write_xlsx, write_parquet, iter_csv, iter_geojson
 
 # Flask-App initialisieren
 app = Flask(__name__)
@@ -35,9 +40,142 @@ if not app.config.get('SECRET_KEY'):
 # API-Konfiguration aus App-Config
 API_KEY = app.config.get('MAPS_API_KEY')
 API_LIMITS = app.config.get('API_LIMITS')
-USAGE_FILE = app.config.get('USAGE_FILE')
 SEARCH_TERMS = app.config.get('SEARCH_TERMS')
 
+# Prozessübergreifender API-Nutzungszähler (übernimmt einmalig die alte JSON-Datei)
+usage_store = UsageStore(
+    app.config.get('USAGE_DB'),
+    API_LIMITS,
+    legacy_file=app.config.get('USAGE_FILE')
+)
+
+# Places-Client mit Connection-Pool (Basis-URL für lokale Stubs überschreibbar)
+places_client = PlacesClient(
+    API_KEY,
+    base_url=app.config.get('PLACES_API_URL'),
+    max_workers=app.config.get('PLACES_MAX_WORKERS'),
+    rate_limit_per_s=app.config.get('PLACES_RATE_LIMIT_PER_S'),
+    timeout_s=app.config.get('PLACES_TIMEOUT_S'),
+    max_pages=app.config.get('PLACES_MAX_PAGES'),
+    max_retries=app.config.get('PLACES_MAX_RETRIES')
+)
+
+# Persistenter Cache für Places-Ergebnisse je Suchbegriff und Rasterzelle
+places_cache = PlacesCache(
+    app.config.get('PLACES_CACHE_DB'),
+    ttl_hours=app.config.get('PLACES_CACHE_TTL_HOURS')
+)
+places_cache.purge_expired()
+
+# Persistenter Geocoding-Cache (normalisierte Adressen)
+geocode_cache = GeocodeCache(
+    app.config.get('GEOCODE_CACHE_DB'),
+    ttl_days=app.config.get('GEOCODE_CACHE_TTL_DAYS')
+)
+
+# Serverseitiger Speicher für Analyse-Ergebnisse (Session hält nur die ID)
+result_store = ResultStore(
+    app.config.get('RESULT_STORE_DB'),
+    ttl_hours=app.config.get('RESULT_TTL_HOURS'),
+    max_results=app.config.get('RESULT_MAX_COUNT')
+)
+
+# Analyse-Pipeline mit gecachten Stufen; der Geo-Stack (osmnx, geopandas, pyproj, ...)
+# wird erst bei der ersten Analyse geladen, siehe get_pipeline()
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+# Stufenzeiten und Zähler aller Analyse-Läufe (für /api/metrics)
+analysis_metrics = Metrics()
+trace_logger = logging.getLogger("routenanalyse.trace")
+if app.config.get('TRACE_LOGGING') and not trace_logger.handlers:
+    trace_logger.addHandler(logging.StreamHandler())
+    trace_logger.setLevel(logging.INFO)
+
+# Worker-Pool für Karten-Jobs (Stufen in Reihenfolge der Pipeline)
+job_manager = JobManager(
+    ["graph", "junctions", "places", "routing", "render"],
+    app.config.get('JOB_STORE_DB'),
+    kind="map",
+    max_workers=app.config.get('JOB_WORKERS'),
+    ttl_s=app.config.get('JOB_TTL_S')
+)
+
+# Worker-Pool für Batch-Analysen mehrerer Standorte
+batch_job_manager = JobManager(
+    ["geocode", "analysis", "export"],
+    app.config.get('JOB_STORE_DB'),
+    kind="batch",
+    max_workers=1,
+    ttl_s=app.config.get('JOB_TTL_S')
+)
+
+def get_pipeline():
+    """Lädt beim ersten Aufruf den Geo-Stack und baut Kachel-Speicher, Graph-Cache und Pipeline auf."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            import osmnx as ox
+            from graph_store import TileGraphStore
+            from graph_cache import GraphCache
+            from csr_graph import CSRStore
+            from pipeline import AnalysisPipeline
+            
+            # osmnx-Einstellungen (HTTP-Cache für Overpass-Antworten)
+            ox.settings.use_cache = True
+            ox.settings.cache_folder = app.config.get('OSMNX_CACHE_DIR')
+            ox.settings.log_console = False
+            
+            _pipeline = AnalysisPipeline(
+                app.config,
+                # Persistenter Kachel-Speicher für Straßennetze
+                TileGraphStore(
+                    app.config.get('GRAPH_STORE_DIR'),
+                    tile_size_deg=app.config.get('GRAPH_TILE_SIZE_DEG'),
+                    max_size_mb=app.config.get('GRAPH_STORE_MAX_MB')
+                ),
+                # Feinere Kacheln für das Detailnetz des gestaffelten Ladens
+                TileGraphStore(
+                    app.config.get('GRAPH_STORE_DIR'),
+                    tile_size_deg=app.config.get('GRAPH_DETAIL_TILE_SIZE_DEG'),
+                    max_size_mb=app.config.get('GRAPH_STORE_MAX_MB')
+                ),
+                # Prozessweiter Cache für fertig aufgebaute Straßennetze
+                GraphCache(
+                    max_size_mb=app.config.get('GRAPH_CACHE_MAX_MB'),
+                    precision=app.config.get('GRAPH_CACHE_PRECISION')
+                ),
+                places_cache,
+                places_client,
+                usage_store,
+                # Memory-mapped CSR-Routing-Netze, von allen Worker-Prozessen geteilt
+                csr_store=CSRStore(
+                    app.config.get('CSR_STORE_DIR'),
+                    max_size_mb=app.config.get('CSR_STORE_MAX_MB')
+                ),
+                max_entries=app.config.get('PIPELINE_CACHE_ENTRIES'),
+                ttl_s=app.config.get('PIPELINE_CACHE_TTL_S')
+            )
+    return _pipeline
+
+def warm_up():
+    """Lädt Geo-Stack und Pipeline vorab, z.B. im Server-Master vor dem Forken der Worker.
+    
+    Baut die pyproj-Transformer einmal auf und lädt optional das Straßennetz
+    der in WARMUP_REGION konfigurierten Region in den Graph-Cache.
+    """
+    import folium  # noqa: F401 (im Master laden, damit die Worker das Modul teilen)
+    from geometry import LocalProjection
+    
+    pipeline = get_pipeline()
+    LocalProjection(51.0, 10.0).circle(1000)
+    
+    region = app.config.get('WARMUP_REGION')
+    if region:
+        lat, lon, radius_km = region
+        # Knotenindex gleich mit aufbauen, damit die Worker ihn erben
+        pipeline.routing_graph(lat, lon, radius_km).node_tree()
+
 # Session-basierte Suchbegriffe (Default aus Config)
 def get_search_terms():
     """Gibt die aktuellen Suchbegriffe aus der Session zurück, oder die Standard-Begriffe."""
@@ -93,111 +231,69 @@ def geocode_address(api_key, address):
         }
 
 # API-Nutzung-Tracking (ohne autocomplete)
-def load_api_usage():
-    """Lädt die API-Nutzungsdaten aus der JSON-Datei."""
-    if not os.path.exists(USAGE_FILE):
-        return {}
-    
-    try:
-        with open(USAGE_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
-
-def save_api_usage(usage_data):
-    """Speichert die API-Nutzungsdaten in der JSON-Datei."""
-    try:
-        with open(USAGE_FILE, 'w') as f:
-            json.dump(usage_data, f, indent=2)
-    except IOError:
-        pass
-
 def check_api_quota(api_type, requests_needed=1):
     """Prüft API-Kontingent."""
-    if api_type not in API_LIMITS:
-        return False, 0, 0
-    
-    usage_data = load_api_usage()
-    current_month = datetime.now().strftime("%Y-%m")
+    return usage_store.check(api_type, requests_needed)
+
+def geocode_with_quota(address):
+    """Geocodiert eine Adresse über den Cache; nur bei Cache-Fehlschlag wird das Kontingent belastet."""
+    cached = geocode_cache.get(address)
+    if cached is not None:
+        return {**cached, "cached": True}
     
-    if current_month not in usage_data:
-        usage_data[current_month] = {}
+    reservation = usage_store.reserve("geocoding", 1)
+    if reservation is None:
+        return {"lat": None, "lng": None, "formatted_address": None, "status": "QUOTA_EXCEEDED"}
     
-    current_usage = usage_data[current_month].get(api_type, 0)
-    max_requests = API_LIMITS[api_type]
+    result = {"status": "REQUEST_FAILED"}
+    try:
+        result = geocode_address(API_KEY, address)
+    finally:
+        usage_store.commit(reservation, 1 if result.get("status") == "OK" else 0)
+    geocode_cache.put(address, result)
+    return result
+
+def geocode_many(addresses):
+    """Geocodiert mehrere Adressen: Cache-Treffer sofort, fehlende parallel (Adresse -> Ergebnis)."""
+    # Gleiche Adressen (nach Normalisierung) nur einmal auflösen
+    unique = {}
+    for address in addresses:
+        unique.setdefault(normalize_address(address), address)
     
-    if current_usage + requests_needed > max_requests:
-        return False, current_usage, max_requests - current_usage
+    results = {address: {**result, "cached": True}
+               for address, result in geocode_cache.get_many(unique.values()).items()}
+    missing = [address for address in unique.values() if address not in results]
     
-    return True, current_usage, max_requests - current_usage
-
-def record_api_usage(api_type, requests_count=1):
-    """Zeichnet die API-Nutzung auf."""
-    if api_type not in API_LIMITS:
-        return
+    reservation = usage_store.reserve("geocoding", len(missing)) if missing else None
+    if missing and reservation is None:
+        for address in missing:
+            results[address] = {"lat": None, "lng": None, "formatted_address": None, "status": "QUOTA_EXCEEDED"}
+        missing = []
     
-    usage_data = load_api_usage()
-    current_month = datetime.now().strftime("%Y-%m")
+    if missing:
+        successful = 0
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(missing), app.config.get('GEOCODE_MAX_WORKERS'))) as executor:
+                fetched = dict(zip(missing, executor.map(lambda a: geocode_address(API_KEY, a), missing)))
+            
+            for address, result in fetched.items():
+                results[address] = result
+                if result.get("status") == "OK":
+                    successful += 1
+                    geocode_cache.put(address, result)
+        finally:
+            usage_store.commit(reservation, successful)
     
-    if current_month not in usage_data:
-        usage_data[current_month] = {}
-    
-    current_usage = usage_data[current_month].get(api_type, 0)
-    usage_data[current_month][api_type] = current_usage + requests_count
-    
-    save_api_usage(usage_data)
-
-# Routing-Funktionen
-def calculate_bearing(lat1, lon1, lat2, lon2):
-    """Berechnet die Peilung zwischen zwei Punkten."""
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dlon = math.radians(lon2 - lon1)
-    x = math.sin(dlon) * math.cos(phi2)
-    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1)*math.cos(phi2)*math.cos(dlon)
-    return (math.degrees(math.atan2(x, y)) + 360) % 360
-
-def bearing_to_direction(bearing):
-    """Konvertiert Peilung zu Himmelsrichtung."""
-    if 0 <= bearing < 22.5 or 337.5 <= bearing < 360:
-        return "N"
-    elif 22.5 <= bearing < 67.5:
-        return "NE"
-    elif 67.5 <= bearing < 112.5:
-        return "E"
-    elif 112.5 <= bearing < 157.5:
-        return "SE"
-    elif 157.5 <= bearing < 202.5:
-        return "S"
-    elif 202.5 <= bearing < 247.5:
-        return "SW"
-    elif 247.5 <= bearing < 292.5:
-        return "W"
-    else:
-        return "NW"
-
-def find_places(api_key, lat, lng, radius, keyword):
-    """Sucht Märkte via Google Places API."""
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lng}",
-        "radius": radius,
-        "keyword": keyword,
-        "type": "supermarket",
-        "key": api_key
-    }
-
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"status": "ERROR", "error": str(e)}
+    return {address: results[unique[normalize_address(address)]] for address in addresses}
 
-def generate_map(festival_lat, festival_lon, radius_km=40, route_radius_km=2, selected_terms=None):
-    """Generiert die Karte mit Märkten und Routen - nur Märkte entlang der Anfahrtsrouten."""
-    from flask import session
-    session['found_markets_data'] = []  # Reset der gefundenen Märkte in Session
+def generate_map(festival_lat, festival_lon, radius_km=40, route_radius_km=2, selected_terms=None, progress=None, output="html"):
+    """Generiert die Karte mit Märkten und Routen - nur Märkte entlang der Anfahrtsrouten.
     
+    Gibt ({"map": HTML, "markets": Exportdaten}, Fehler) zurück; mit output="geojson"
+    statt "map" eine kompakte GeoJSON-FeatureCollection unter "geojson". Der optionale
+    progress-Callback wird beim Start jeder Pipeline-Stufe mit deren Namen aufgerufen.
+    Zwischenergebnisse werden je Stufe gecacht (siehe AnalysisPipeline).
+    """
     # Verwende ausgewählte Suchbegriffe oder alle verfügbaren
     if selected_terms is None:
         search_terms = get_search_terms()
@@ -207,256 +303,30 @@ def generate_map(festival_lat, festival_lon, radius_km=40, route_radius_km=2, se
     if not search_terms:
         return None, "Keine Suchbegriffe ausgewählt"
     
-    try:
-        radius_m = radius_km * 1000
-        ROUTE_BUFFER_M = route_radius_km * 1000  # Puffer um die Route in Metern
-        
-        # Festival-Punkt
-        festival_point_wgs = Point(festival_lon, festival_lat)
-        project_wgs_to_merc = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform
-        project_merc_to_wgs = pyproj.Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True).transform
-        
-        festival_point_merc = transform(project_wgs_to_merc, festival_point_wgs)
-        buffered_merc = festival_point_merc.buffer(radius_m)
-        circle_polygon = transform(project_merc_to_wgs, buffered_merc)
-        
-        # OSM-Straßennetz laden
+    pipeline = get_pipeline()
+    from pipeline import PipelineError
+    
+    # Jeder Lauf wird mit Stufenzeiten und Zählern protokolliert
+    with analysis_metrics.trace("generate_map", radius_km=radius_km, route_radius_km=route_radius_km,
+                                terms=len(search_terms), output=output) as trace:
         try:
-            G = ox.graph_from_polygon(circle_polygon, network_type='drive')
-        except:
-            G = ox.graph_from_point((festival_lat, festival_lon), dist=radius_m, network_type='drive')
-        
-        # Anschlussstellen finden
-        highway_values = ["motorway_link", "trunk_link"]
-        connections_gdfs = []
-        
-        for val in highway_values:
-            try:
-                gdf_features = ox.features_from_polygon(circle_polygon, tags={"highway": val})
-                if len(gdf_features) > 0:
-                    point_list = []
-                    for _, rowf in gdf_features.iterrows():
-                        geom = rowf["geometry"]
-                        if isinstance(geom, Point):
-                            point_list.append(geom)
-                        elif hasattr(geom, "centroid"):
-                            point_list.append(geom.centroid)
-                    
-                    if point_list:
-                        conn_gdf = gpd.GeoDataFrame(geometry=point_list, crs="EPSG:4326")
-                        conn_gdf["conn_type"] = val
-                        connections_gdfs.append(conn_gdf)
-            except:
-                continue
-        
-        # Fallback für Anschlussstellen
-        if not connections_gdfs:
-            important_nodes = []
-            for node_id, node_data in G.nodes(data=True):
-                if G.degree[node_id] >= 3:
-                    point = Point(node_data['x'], node_data['y'])
-                    important_nodes.append(point)
-            
-            if important_nodes:
-                nodes_gdf = gpd.GeoDataFrame(geometry=important_nodes[:20], crs="EPSG:4326")
-                nodes_gdf["conn_type"] = "network_junction"
-                connections_gdfs.append(nodes_gdf)
-        
-        if not connections_gdfs:
-            return None, "Keine Anschlussstellen gefunden"
-        
-        connections_gdf = pd.concat(connections_gdfs, ignore_index=True)
-        
-        # Distanz zum Festival berechnen
-        festival_gdf = gpd.GeoDataFrame(geometry=[festival_point_wgs], crs="EPSG:4326").to_crs(epsg=3857)
-        festival_point_merc = festival_gdf.geometry.iloc[0]
-        connections_gdf_merc = connections_gdf.to_crs(epsg=3857)
-        connections_gdf_merc["distance_m"] = connections_gdf_merc.distance(festival_point_merc)
-        connections_gdf = connections_gdf_merc.to_crs(epsg=4326)
-        connections_gdf["festival_dist_km"] = connections_gdf_merc["distance_m"] / 1000.0
-        
-        # Richtungen berechnen
-        connections_gdf["bearing"] = connections_gdf.apply(
-            lambda row: calculate_bearing(festival_lat, festival_lon, row.geometry.y, row.geometry.x), axis=1)
-        connections_gdf["direction"] = connections_gdf["bearing"].apply(bearing_to_direction)
-        
-        # Pro Richtung: nächste Anschlussstelle auswählen
-        eight_dirs = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
-        selected_exits = []
-        for d in eight_dirs:
-            subset = connections_gdf[connections_gdf["direction"] == d]
-            if len(subset) > 0:
-                idxmin = subset["festival_dist_km"].idxmin()
-                selected_exits.append(subset.loc[idxmin])
-        
-        if not selected_exits:
-            return None, "Keine Anschlussstellen in den Hauptrichtungen gefunden"
-        
-        selected_exits_gdf = gpd.GeoDataFrame(selected_exits, geometry="geometry", crs="EPSG:4326")
-        
-        # Märkte finden
-        if not API_KEY:
-            return None, "Kein API-Key verfügbar"
-        
-        # API-Kontingent prüfen
-        quota_ok, _, _ = check_api_quota("places", len(search_terms))
-        if not quota_ok:
-            return None, "API-Limit erreicht"
-        
-        all_markets = []
-        for term in search_terms:
-            results = find_places(API_KEY, festival_lat, festival_lon, radius_m, term)
-            if results.get("status") == "OK":
-                # Keyword zu jedem gefundenen Markt hinzufügen
-                for market in results.get("results", []):
-                    market["search_keyword"] = term
-                all_markets.extend(results.get("results", []))
-        
-        if all_markets:
-            record_api_usage("places", len(search_terms))
-        
-        # Märkte zu GeoDataFrame konvertieren
-        market_points = [Point(store["geometry"]["location"]["lng"], store["geometry"]["location"]["lat"]) for store in all_markets]
-        markets_gdf = gpd.GeoDataFrame(all_markets, geometry=market_points, crs="EPSG:4326")
-        
-        # Routing + Buffering + Markt-Filterung
-        festival_node = ox.distance.nearest_nodes(G, festival_lon, festival_lat)
-        
-        def to_merc(geom):
-            return transform(project_wgs_to_merc, geom)
-        
-        def to_wgs(geom):
-            return transform(project_merc_to_wgs, geom)
-        
-        results_list = []
-        
-        for idx, row in selected_exits_gdf.iterrows():
-            exit_point = row.geometry
-            direction = row["direction"]
-            exit_node = ox.distance.nearest_nodes(G, exit_point.x, exit_point.y)
-            
-            try:
-                route_node_ids = ox.shortest_path(G, festival_node, exit_node, weight="length")
-            except:
-                continue
-            
-            if not route_node_ids or len(route_node_ids) < 2:
-                continue
-            
-            # Route als LineString erstellen
-            route_coords = [(G.nodes[node]["x"], G.nodes[node]["y"]) for node in route_node_ids]
-            route_line_wgs = LineString(route_coords)
-            
-            # Route zu Mercator projizieren und buffern
-            route_line_merc = to_merc(route_line_wgs)
-            corridor_merc = route_line_merc.buffer(ROUTE_BUFFER_M)
-            corridor_wgs = to_wgs(corridor_merc)
-            
-            # Märkte innerhalb des Korridors finden
-            inside_corridor = markets_gdf[markets_gdf.geometry.within(corridor_wgs)]
-            
-            results_list.append({
-                "direction": direction,
-                "exit_point": exit_point,
-                "route_line_wgs": route_line_wgs,
-                "corridor_wgs": corridor_wgs,
-                "markets_count": len(inside_corridor),
-                "markets_df": inside_corridor.copy()
-            })
-        
-        # Karte erstellen
-        m = folium.Map(location=[festival_lat, festival_lon], zoom_start=9)
-        
-        # Festival-Marker
-        folium.Marker(
-            location=[festival_lat, festival_lon], 
-            popup="Festivalort", 
-            icon=folium.Icon(color='purple', icon='star')
-        ).add_to(m)
-        
-        # Suchradius
-        folium.Circle(
-            location=[festival_lat, festival_lon], 
-            radius=radius_m, 
-            color='black', 
-            fill=False, 
-            dash_array='5,5', 
-            tooltip=f"{radius_km} km Umkreis"
-        ).add_to(m)
-        
-        # Alle Anschlussstellen (grau)
-        for _, rowc in connections_gdf.iterrows():
-            folium.CircleMarker(
-                location=[rowc.geometry.y, rowc.geometry.x], 
-                radius=2, 
-                color='gray', 
-                fill=True, 
-                fill_opacity=0.6,
-                popup=f"Anschlussstelle: {rowc.get('conn_type', 'unknown')}"
-            ).add_to(m)
-        
-        # Farbzuordnung für Richtungen
-        dir_colors = {
-            "N": "darkblue", 
-            "NE": "blue", 
-            "E": "cadetblue", 
-            "SE": "green", 
-            "S": "darkgreen", 
-            "SW": "orange", 
-            "W": "red", 
-            "NW": "darkred"
-        }
-        
-        # Routen und gefilterte Märkte anzeigen
-        for r in results_list:
-            direction = r["direction"]
-            exit_pt = r["exit_point"]
-            route_line = r["route_line_wgs"]
-            markets_df = r["markets_df"]
-            color = dir_colors.get(direction, "gray")
-            
-            # Anschlussstelle markieren
-            folium.Marker(
-                location=[exit_pt.y, exit_pt.x], 
-                popup=f"{direction}-Anschlussstelle<br>Märkte: {len(markets_df)}", 
-                icon=folium.Icon(color=color, icon='flag')
-            ).add_to(m)
-            
-            # Route zeichnen
-            coords_list = [(lat, lon) for lon, lat in route_line.coords]
-            folium.PolyLine(
-                locations=coords_list, 
-                color=color, 
-                weight=4, 
-                opacity=0.7, 
-                tooltip=f"Route Richtung {direction} ({len(markets_df)} Märkte)"
-            ).add_to(m)
-            
-            # Nur Märkte entlang der Route anzeigen und für Export sammeln
-            for _, store_row in markets_df.iterrows():
-                folium.Marker(
-                    location=[store_row.geometry.y, store_row.geometry.x],
-                    icon=folium.Icon(color=color, icon='shopping-cart'),
-                    popup=f"<b>{store_row.get('name', 'Markt')}</b><br>Richtung: {direction}<br>Adresse: {store_row.get('vicinity', '')}<br>Bewertung: {store_row.get('rating', 'N/A')}"
-                ).add_to(m)
-                
-                # Markt-Daten für Excel-Export sammeln
-                market_export_data = {
-                    'name': store_row.get('name', 'Unbekannt'),
-                    'vicinity': store_row.get('vicinity', 'Keine Adresse verfügbar'),
-                    'search_keyword': store_row.get('search_keyword', 'Unbekannt'),
-                    'lat': store_row.geometry.y,
-                    'lng': store_row.geometry.x
-                }
-                session['found_markets_data'].append(market_export_data)
-        
-        # Karte als HTML-String zurückgeben
-        map_html = m._repr_html_()
-        
-        return map_html, None
-        
-    except Exception as e:
-        return None, f"Fehler bei der Kartenerstellung: {str(e)}"
+            result = pipeline.run(festival_lat, festival_lon, radius_km, route_radius_km, search_terms,
+                                  output=output, progress=progress)
+            return result, None
+        except PipelineError as e:
+            trace.status, trace.error = "rejected", str(e)
+            return None, str(e)
+        except Exception as e:
+            app.logger.exception("Fehler bei der Kartenerstellung")
+            trace.status, trace.error = "error", f"{type(e).__name__}: {e}"
+            return None, f"Fehler bei der Kartenerstellung: {str(e)}"
+
+def profile_mode():
+    """Gewünschter Profiler aus dem Header X-Profile (nur wenn in der Config freigeschaltet)."""
+    mode = request.headers.get('X-Profile', '').strip().lower()
+    if not app.config.get('PROFILING_ENABLED') or mode not in ("cprofile", "pyinstrument"):
+        return None
+    return mode
 
 # Flask-Routen (OHNE /api/autocomplete)
 @app.route('/')
@@ -485,21 +355,15 @@ def geocode():
         
         address = data['address'].strip()
         
-        # API-Kontingent prüfen
-        quota_ok, current_usage, remaining = check_api_quota("geocoding", 1)
-        if not quota_ok:
+        # Über den Cache geocodieren; nur bei Cache-Fehlschlag wird das Kontingent belastet
+        result = geocode_with_quota(address)
+        if result.get("status") == "QUOTA_EXCEEDED":
+            _, current_usage, remaining = check_api_quota("geocoding", 1)
             return jsonify({
                 "error": f"API-Limit erreicht. Aktuelle Nutzung: {current_usage}, Verbleiband: {remaining}",
                 "status": "QUOTA_EXCEEDED"
             }), 429
         
-        # Geocoding durchführen
-        result = geocode_address(API_KEY, address)
-        
-        # API-Nutzung nur bei erfolgreichem Request aufzeichnen
-        if result.get("status") == "OK":
-            record_api_usage("geocoding", 1)
-        
         return jsonify(result)
         
     except Exception as e:
@@ -509,9 +373,65 @@ def geocode():
             "status": "SERVER_ERROR"
         }), 500
 
+@app.route('/api/geocode/batch', methods=['POST'])
+def geocode_batch():
+    """API-Endpunkt für das Geocoding mehrerer Adressen (Cache-Treffer ohne API-Aufruf)."""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('addresses'), list):
+        return jsonify({"error": "Liste 'addresses' erforderlich", "status": "MISSING_ADDRESSES"}), 400
+    
+    addresses = [str(a).strip() for a in data['addresses'] if str(a).strip()]
+    if len(addresses) > app.config.get('GEOCODE_BATCH_MAX'):
+        return jsonify({"error": f"Maximal {app.config.get('GEOCODE_BATCH_MAX')} Adressen pro Anfrage",
+                        "status": "TOO_MANY_ADDRESSES"}), 400
+    
+    if not API_KEY:
+        # Ohne API-Key nur Cache-Treffer liefern
+        cached = geocode_cache.get_many(addresses)
+        results = {a: cached.get(a, {"lat": None, "lng": None, "formatted_address": None, "status": "NO_API_KEY"})
+                   for a in addresses}
+    else:
+        results = geocode_many(addresses)
+    
+    return jsonify({"results": [{"address": a, **results[a]} for a in addresses]})
+
+@app.route('/api/geocode/reverse', methods=['GET'])
+def geocode_reverse():
+    """Rückwärtssuche im Geocoding-Cache (ohne API-Aufruf)."""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        return jsonify({"error": "Parameter 'lat' und 'lng' erforderlich"}), 400
+    
+    result = geocode_cache.reverse(lat, lng)
+    if result is None:
+        return jsonify({"status": "ZERO_RESULTS"}), 404
+    return jsonify({**result, "cached": True})
+
+def store_result(result, **params):
+    """Legt die Märkte eines Ergebnisses im Ergebnis-Speicher ab und ersetzt sie durch die Ergebnis-ID."""
+    result_id = result_store.save(result["markets"], params)
+    return {**{key: value for key, value in result.items() if key != "markets"}, "result_id": result_id}
+
+def run_map_job(lat, lng, radius, route_radius, selected_terms, output="html", profile=None, progress=None):
+    """Führt generate_map als Hintergrund-Job aus (Fehler werden als Ausnahme gemeldet)."""
+    if profile:
+        with profiled(profile) as report:
+            result, error = generate_map(lat, lng, radius, route_radius, selected_terms, progress=progress, output=output)
+    else:
+        result, error = generate_map(lat, lng, radius, route_radius, selected_terms, progress=progress, output=output)
+    if error:
+        raise RuntimeError(error)
+    result = store_result(result, lat=lat, lng=lng, radius=radius, route_radius=route_radius, terms=selected_terms)
+    if profile:
+        result["profile"] = report["text"]
+    return result
+
 @app.route('/api/generate_map', methods=['POST'])
 def api_generate_map():
-    """API-Endpunkt für Kartenerstellung."""
+    """API-Endpunkt für Kartenerstellung (synchron oder mit "async": true als Job)."""
+    from flask import session
+    
     data = request.get_json()
     if not data or 'lat' not in data or 'lng' not in data:
         return jsonify({"error": "Fehlende Koordinaten"}), 400
@@ -521,13 +441,151 @@ def api_generate_map():
     radius = int(data.get('radius', 40))
     route_radius = float(data.get('route_radius', 2))
     selected_terms = data.get('selected_terms', None)  # Neue Parameter für ausgewählte Suchbegriffe
+    output = data.get('format', 'html')  # "html" (Folium) oder "geojson" (Darstellung im Browser)
+    if output not in ("html", "geojson"):
+        return jsonify({"error": "Ungültiges Format"}), 400
+    
+    if data.get('async'):
+        # Suchbegriffe hier auflösen, da der Job keinen Zugriff auf die Session hat
+        terms = selected_terms if selected_terms is not None else get_search_terms()
+        profile = profile_mode()
+        key = job_key(lat=lat, lng=lng, radius=radius, route_radius=route_radius, terms=terms, output=output,
+                      profile=profile)
+        job_id, created = job_manager.submit(key, run_map_job, lat, lng, radius, route_radius, terms, output, profile)
+        return jsonify({"job_id": job_id, "created": created, "status_url": f"/api/jobs/{job_id}"}), 202
     
-    map_html, error = generate_map(lat, lng, radius, route_radius, selected_terms)
+    profile = profile_mode()
+    if profile:
+        with profiled(profile) as report:
+            result, error = generate_map(lat, lng, radius, route_radius, selected_terms, output=output)
+    else:
+        result, error = generate_map(lat, lng, radius, route_radius, selected_terms, output=output)
     
     if error:
+        session.pop('result_id', None)
         return jsonify({"error": error}), 500
     
-    return jsonify({"map": map_html})
+    result = store_result(result, lat=lat, lng=lng, radius=radius, route_radius=route_radius,
+                          terms=selected_terms if selected_terms is not None else get_search_terms())
+    session['result_id'] = result["result_id"]
+    if profile:
+        result["profile"] = report["text"]
+    return jsonify(result)
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """API-Endpunkt für Status und Ergebnis eines Karten-Jobs."""
+    from flask import session
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unbekannter Job"}), 404
+    
+    response = {key: job[key] for key in ("id", "status", "current_stage", "progress", "stages", "error")}
+    if job["status"] == "done":
+        # Ergebnis-ID an die Session des abfragenden Clients binden (für den Export)
+        session['result_id'] = job["result"]["result_id"]
+        response.update(job["result"])
+    
+    return jsonify(response)
+
+def purge_batch_outputs():
+    """Löscht Batch-ZIPs, deren Job abgelaufen ist (gleiche Frist wie JOB_TTL_S)."""
+    output_dir = app.config.get('BATCH_OUTPUT_DIR')
+    if not os.path.isdir(output_dir):
+        return
+    min_time = datetime.now().timestamp() - app.config.get('JOB_TTL_S')
+    for entry in os.scandir(output_dir):
+        try:
+            if entry.stat().st_mtime >= min_time:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            # Von einem anderen Worker bereits gelöscht
+            pass
+
+def run_batch_job(sites, radius, route_radius, terms, progress=None):
+    """Führt eine Batch-Analyse als Hintergrund-Job aus und packt die Ergebnisse in ein ZIP."""
+    progress("geocode")
+    geocode_sites(sites, geocode_many)
+    
+    progress("analysis")
+    results = run_batch(
+        sites, radius, route_radius, terms,
+        workers=app.config.get('BATCH_WORKERS'),
+        region_deg=app.config.get('BATCH_REGION_DEG')
+    )
+    
+    progress("export")
+    os.makedirs(app.config.get('BATCH_OUTPUT_DIR'), exist_ok=True)
+    out_dir = tempfile.mkdtemp(dir=app.config.get('BATCH_OUTPUT_DIR'))
+    try:
+        write_outputs(results, out_dir)
+        zip_path = shutil.make_archive(out_dir, 'zip', out_dir)
+    finally:
+        # Nur das ZIP bleibt; es wird mit dem Job nach JOB_TTL_S gelöscht
+        shutil.rmtree(out_dir, ignore_errors=True)
+    
+    return {
+        "zip_path": zip_path,
+        "sites": len(results),
+        "failed": sum(1 for r in results if r["error"])
+    }
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    """API-Endpunkt für die Batch-Analyse einer hochgeladenen CSV-/Excel-Datei."""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({"error": "Datei erforderlich"}), 400
+    
+    content = upload.read()
+    try:
+        sites = read_sites(BytesIO(content), upload.filename)
+    except Exception as e:
+        return jsonify({"error": f"Datei konnte nicht gelesen werden: {str(e)}"}), 400
+    
+    if not sites:
+        return jsonify({"error": "Keine Standorte in der Datei"}), 400
+    if len(sites) > app.config.get('BATCH_MAX_SITES'):
+        return jsonify({"error": f"Maximal {app.config.get('BATCH_MAX_SITES')} Standorte pro Batch"}), 400
+    
+    radius = int(request.form.get('radius', app.config.get('DEFAULT_RADIUS_KM')))
+    route_radius = float(request.form.get('route_radius', 2))
+    terms = [t.strip() for t in request.form.get('terms', '').split(',') if t.strip()] or get_search_terms()
+    
+    purge_batch_outputs()
+    key = job_key(content=hashlib.sha1(content).hexdigest(), radius=radius, route_radius=route_radius, terms=terms)
+    job_id, created = batch_job_manager.submit(key, run_batch_job, sites, radius, route_radius, terms)
+    return jsonify({"job_id": job_id, "created": created, "sites": len(sites),
+                    "status_url": f"/api/batch/{job_id}"}), 202
+
+@app.route('/api/batch/<job_id>')
+def api_batch_status(job_id):
+    """API-Endpunkt für den Status einer Batch-Analyse."""
+    job = batch_job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unbekannter Job"}), 404
+    
+    response = {key: job[key] for key in ("id", "status", "current_stage", "progress", "stages", "error")}
+    if job["status"] == "done":
+        response.update(sites=job["result"]["sites"], failed=job["result"]["failed"],
+                        download_url=f"/api/batch/{job_id}/download")
+    return jsonify(response)
+
+@app.route('/api/batch/<job_id>/download')
+def api_batch_download(job_id):
+    """API-Endpunkt zum Herunterladen der Batch-Ergebnisse (Excel + GeoJSON als ZIP)."""
+    job = batch_job_manager.get(job_id)
+    if job is None or job["status"] != "done" or not os.path.exists(job["result"]["zip_path"]):
+        return jsonify({"error": "Keine Ergebnisse verfügbar"}), 404
+    
+    date_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return send_file(job["result"]["zip_path"], mimetype='application/zip',
+                     as_attachment=True, download_name=f"LEH_Batch_{date_str}.zip")
 
 @app.route('/api/search_terms', methods=['GET'])
 def api_get_search_terms():
@@ -574,13 +632,8 @@ def api_reset_search_terms():
 @app.route('/api/stats')
 def api_stats():
     """API-Endpunkt für Nutzungsstatistiken (ohne autocomplete)."""
-    usage_data = load_api_usage()
     current_month = datetime.now().strftime("%Y-%m")
-    
-    if current_month not in usage_data:
-        usage_data[current_month] = {}
-    
-    current_month_data = usage_data[current_month]
+    current_month_data = usage_store.month_usage(current_month)
     
     stats = {}
     for api_type, max_requests in API_LIMITS.items():
@@ -600,60 +653,94 @@ def api_stats():
         "apis": stats
     })
 
+def result_markets(result_id):
+    """Liest die Märkte eines Ergebnisses mit den Filtern aus den Query-Parametern.
+    
+    Unterstützt 'keyword' und 'direction' (mehrfach angebbar) sowie 'max_distance_m'.
+    """
+    return result_store.markets(
+        result_id,
+        search_keywords=request.args.getlist('keyword'),
+        directions=request.args.getlist('direction'),
+        max_distance_m=request.args.get('max_distance_m', type=float)
+    )
+
+@app.route('/api/results/<result_id>')
+def api_result(result_id):
+    """API-Endpunkt für gespeicherte Ergebnisse (Märkte optional nachgefiltert)."""
+    meta = result_store.get(result_id)
+    if meta is None:
+        return jsonify({"error": "Unbekanntes oder abgelaufenes Ergebnis"}), 404
+    
+    markets = result_markets(result_id)
+    return jsonify({**meta, "markets": markets, "filtered_count": len(markets)})
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Kennzahlen im Prometheus-Textformat (Stufenzeiten, Zähler, API-Nutzung)."""
+    lines = [analysis_metrics.render_prometheus().rstrip("\n")]
+    lines.append("# HELP routenanalyse_api_usage API-Nutzung im laufenden Monat")
+    lines.append("# TYPE routenanalyse_api_usage gauge")
+    for api_type, used in usage_store.month_usage().items():
+        lines.append(f'routenanalyse_api_usage{{api="{api_type}"}} {used}')
+    lines.append("# TYPE routenanalyse_api_limit gauge")
+    for api_type, max_requests in API_LIMITS.items():
+        lines.append(f'routenanalyse_api_limit{{api="{api_type}"}} {max_requests}')
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
 @app.route('/api/export_markets')
 def export_markets():
-    """API-Endpunkt für Excel-Export der gefundenen Märkte."""
+    """API-Endpunkt für den Export der gefundenen Märkte (Ergebnis aus Session oder ?result_id=).
+    
+    ?format= wählt xlsx (Standard), csv, geojson oder parquet. CSV und GeoJSON werden
+    direkt gestreamt, Excel und Parquet zeilenweise in eine temporäre Datei geschrieben.
+    """
     from flask import session
     
-    data = session.get('found_markets_data', [])
-    if not data:
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Ungültiges Exportformat"}), 400
+    
+    result_id = request.args.get('result_id') or session.get('result_id')
+    meta = result_store.get(result_id) if result_id else None
+    if meta is None or meta["market_count"] == 0:
         return jsonify({"error": "Keine Märkte zum Exportieren verfügbar. Erstellen Sie zuerst eine Karte."}), 400
     
+    # Duplikate entfernen (falls ein Markt mit mehreren Keywords gefunden wurde)
+    rows = unique_markets(result_store.iter_markets(
+        result_id,
+        search_keywords=request.args.getlist('keyword'),
+        directions=request.args.getlist('direction'),
+        max_distance_m=request.args.get('max_distance_m', type=float)
+    ))
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    date_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"LEH_Export_{date_str}.{extension}"
+    
+    if export_format in ("csv", "geojson"):
+        chunks = iter_csv(rows) if export_format == "csv" else iter_geojson(rows)
+        return Response(stream_with_context(chunks), mimetype=mimetype,
+                        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    
+    fd, path = tempfile.mkstemp(suffix=f".{extension}")
+    os.close(fd)
     try:
-        # DataFrame aus den gesammelten Daten erstellen
-        df = pd.DataFrame(data)
-        
-        # Nur die gewünschten Spalten für den Export auswählen
-        export_df = df[['name', 'vicinity', 'search_keyword']].copy()
-        export_df.columns = ['Marktname', 'Adresse', 'Suchbegriff']
-        
-        # Duplikate entfernen (falls ein Markt mit mehreren Keywords gefunden wurde)
-        export_df = export_df.drop_duplicates(subset=['Marktname', 'Adresse'])
-        
-        # Excel-Datei in Memory erstellen
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            export_df.to_excel(writer, sheet_name='LEH_Export', index=False)
-            
-            # Spaltenbreite anpassen
-            worksheet = writer.sheets['LEH_Export']
-            for column in worksheet.columns:
-                max_length = 0
-                column = [cell for cell in column]
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2) * 1.2
-                worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        output.seek(0)
-        
-        # Aktuelles Datum für Dateinamen
-        date_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"LEH_Export_{date_str}.xlsx"
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
-        
+        if export_format == "xlsx":
+            write_xlsx(path, [('LEH_Export', EXPORT_COLUMNS, rows, meta["max_lengths"])])
+        else:
+            write_parquet(path, rows)
+    except ImportError:
+        os.remove(path)
+        return jsonify({"error": f"Export als {export_format} auf dem Server nicht verfügbar"}), 400
     except Exception as e:
-        return jsonify({"error": f"Fehler beim Erstellen der Excel-Datei: {str(e)}"}), 500
+        os.remove(path)
+        return jsonify({"error": f"Fehler beim Erstellen der Exportdatei: {str(e)}"}), 500
+    
+    # Datei von der Platte senden und danach löschen
+    response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename)
+    response.call_on_close(lambda: os.remove(path))
+    return response
 
 if __name__ == '__main__':
     print("🌟 Festival Märkte Finder - Einfache Version")
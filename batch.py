@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import math
+import argparse
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from exporter import EXPORT_COLUMNS, write_xlsx
+
+
+def read_sites(source, filename=None):
+    """Liest Standorte aus einer CSV- oder Excel-Datei.
+
+    Erwartet eine Spalte 'address' oder die Spalten 'lat'/'lng' (alternativ 'lon');
+    optional 'name'. Gibt eine Liste von Dicts zurück.
+    """
+    import pandas as pd
+
+    filename = filename or str(source)
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(source)
+    else:
+        df = pd.read_csv(source, sep=None, engine='python')
+
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    if 'lon' in df.columns and 'lng' not in df.columns:
+        df = df.rename(columns={'lon': 'lng'})
+    if 'address' not in df.columns and not {'lat', 'lng'} <= set(df.columns):
+        raise ValueError("Spalte 'address' oder Spalten 'lat'/'lng' erforderlich")
+
+    sites = []
+    for i, row in enumerate(df.to_dict('records')):
+        lat, lng = row.get('lat'), row.get('lng')
+        has_coords = lat is not None and lng is not None and not (pd.isna(lat) or pd.isna(lng))
+        address = row.get('address')
+        address = None if address is None or pd.isna(address) else str(address).strip()
+        name = row.get('name')
+        sites.append({
+            "index": i,
+            "name": str(name) if name is not None and not pd.isna(name) else (address or f"Standort {i + 1}"),
+            "address": address,
+            "lat": float(lat) if has_coords else None,
+            "lng": float(lng) if has_coords else None
+        })
+    return sites
+
+
+def geocode_sites(sites, geocode_many):
+    """Ergänzt fehlende Koordinaten mit einem Batch-Aufruf.
+
+    geocode_many(Adressen) gibt {Adresse: Ergebnis wie geocode_address} zurück
+    und löst identische Adressen nur einmal auf.
+    """
+    pending = [site for site in sites if site["lat"] is None and site["address"]]
+    results = geocode_many([site["address"] for site in pending]) if pending else {}
+    for site in pending:
+        result = results[site["address"]]
+        if result.get("status") == "OK":
+            site["lat"], site["lng"] = result["lat"], result["lng"]
+            site["formatted_address"] = result.get("formatted_address")
+        else:
+            site["error"] = f"Geocoding fehlgeschlagen: {result.get('status')}"
+    return sites
+
+
+def group_by_region(sites, region_deg):
+    """Gruppiert Standorte nach Rasterzellen, damit nahe Standorte nacheinander im selben Prozess laufen."""
+    groups = defaultdict(list)
+    for site in sites:
+        cell = (math.floor(site["lat"] / region_deg), math.floor(site["lng"] / region_deg))
+        groups[cell].append(site)
+    return list(groups.values())
+
+
+def _analyse_group(sites, radius_km, route_radius_km, terms):
+    """Analysiert alle Standorte einer Region nacheinander im selben Worker-Prozess."""
+    from app import generate_map
+
+    results = []
+    for site in sites:
+        result, error = generate_map(site["lat"], site["lng"], radius_km, route_radius_km, terms, output="geojson")
+        results.append({
+            "site": site,
+            "error": error,
+            "geojson": result["geojson"] if result else None,
+            "markets": result["markets"] if result else []
+        })
+    return results
+
+
+def run_batch(sites, radius_km, route_radius_km, terms, workers=2, region_deg=0.5, progress=None):
+    """Führt die Analyse für alle Standorte in einem Prozess-Pool aus.
+
+    Standorte derselben Region laufen nacheinander im selben Prozess: fehlende
+    Kacheln und Places-Zellen werden so nicht von zwei Prozessen gleichzeitig
+    geladen, spätere Standorte lesen sie aus den gemeinsamen Speichern auf der
+    Festplatte. Den In-Memory-Graph-Cache teilen sie nicht (andere Zentren).
+    Die Worker werden per "spawn" gestartet, da fork aus dem mehrfädigen
+    Server-Prozess nicht sicher ist. progress(erledigt, gesamt) wird nach
+    jeder Region aufgerufen.
+    """
+    results = [{"site": s, "error": s["error"], "geojson": None, "markets": []} for s in sites if s.get("error")]
+    valid_sites = [s for s in sites if not s.get("error") and s["lat"] is not None]
+    results.extend({"site": s, "error": "Keine Koordinaten", "geojson": None, "markets": []}
+                   for s in sites if not s.get("error") and s["lat"] is None)
+
+    groups = group_by_region(valid_sites, region_deg)
+    done = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_analyse_group, group, radius_km, route_radius_km, terms) for group in groups]
+        for future in as_completed(futures):
+            results.extend(future.result())
+            done += 1
+            if progress is not None:
+                progress(done, len(groups))
+
+    return sorted(results, key=lambda r: r["site"]["index"])
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', text).strip('_')[:50] or "standort"
+
+
+SUMMARY_COLUMNS = [
+    ("name", "Standort"),
+    ("address", "Adresse"),
+    ("lat", "Breitengrad"),
+    ("lng", "Längengrad"),
+    ("markets", "Märkte"),
+    ("error", "Fehler")
+]
+
+MARKET_COLUMNS = [("site", "Standort")] + EXPORT_COLUMNS
+
+
+def _track_lengths(max_lengths, row, keys):
+    """Führt die maximale Textlänge je Spalte für die Spaltenbreiten mit."""
+    for key in keys:
+        value = row.get(key)
+        if isinstance(value, str):
+            max_lengths[key] = max(max_lengths.get(key, 0), len(value))
+
+
+def write_outputs(results, out_dir):
+    """Schreibt eine gemeinsame Excel-Datei und je Standort eine GeoJSON-Datei."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    summary_rows = []
+    summary_lengths, market_lengths = {}, {}
+    geojson_paths = []
+    for r in results:
+        site = r["site"]
+        row = {
+            "name": site["name"],
+            "address": site.get("formatted_address") or site["address"],
+            "lat": site["lat"],
+            "lng": site["lng"],
+            "markets": len(r["markets"]),
+            "error": r["error"] or ''
+        }
+        summary_rows.append(row)
+        _track_lengths(summary_lengths, row, ("name", "address", "error"))
+        for market in r["markets"]:
+            _track_lengths(market_lengths, {"site": site["name"], **market},
+                           ("site", "name", "vicinity", "search_keyword", "direction"))
+        if r["geojson"] is not None:
+            path = os.path.join(out_dir, f"{site['index'] + 1:03d}_{_slug(site['name'])}.geojson")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(r["geojson"], f, ensure_ascii=False)
+            geojson_paths.append(path)
+
+    # Marktzeilen erst beim Schreiben erzeugen (Write-Only-Modus, keine Kopie im Speicher)
+    market_rows = ({"site": r["site"]["name"], **market} for r in results for market in r["markets"])
+    workbook_path = os.path.join(out_dir, "LEH_Batch_Export.xlsx")
+    write_xlsx(workbook_path, [
+        ('Standorte', SUMMARY_COLUMNS, summary_rows, summary_lengths),
+        ('Maerkte', MARKET_COLUMNS, market_rows, market_lengths)
+    ])
+
+    return workbook_path, geojson_paths
+
+
+def main():
+    """Kommandozeile für die Batch-Analyse."""
+    import app as webapp
+
+    parser = argparse.ArgumentParser(description="Batch-Analyse für mehrere Festival-Standorte")
+    parser.add_argument('input', help="CSV- oder Excel-Datei mit Spalte 'address' oder 'lat'/'lng'")
+    parser.add_argument('--out', default='batch_output', help="Ausgabeverzeichnis")
+    parser.add_argument('--radius', type=int, default=webapp.app.config.get('DEFAULT_RADIUS_KM'))
+    parser.add_argument('--route-radius', type=float, default=webapp.app.config.get('ROUTE_BUFFER_M') / 1000)
+    parser.add_argument('--terms', nargs='+', default=webapp.SEARCH_TERMS)
+    parser.add_argument('--workers', type=int, default=webapp.app.config.get('BATCH_WORKERS'))
+    args = parser.parse_args()
+
+    sites = read_sites(args.input)
+    print(f"📍 {len(sites)} Standorte eingelesen")
+    geocode_sites(sites, webapp.geocode_many)
+
+    results = run_batch(
+        sites, args.radius, args.route_radius, args.terms,
+        workers=args.workers,
+        region_deg=webapp.app.config.get('BATCH_REGION_DEG'),
+        progress=lambda done, total: print(f"  Region {done}/{total} abgeschlossen")
+    )
+    workbook_path, geojson_paths = write_outputs(results, args.out)
+    failed = sum(1 for r in results if r["error"])
+    print(f"✅ {workbook_path} und {len(geojson_paths)} GeoJSON-Dateien geschrieben ({failed} Fehler)")
+
+
+if __name__ == '__main__':
+    main()
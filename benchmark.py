@@ -0,0 +1,398 @@
+"""Offline-Benchmark der Analyse-Pipeline.
+
+Spielt die aufgezeichneten Overpass-Antworten aus cache/ über einen lokalen
+Overpass-Stub ein und beantwortet Places-Anfragen über einen lokalen Stub
+(aufgezeichnete JSON-Datei oder deterministisch erzeugte Märkte). Gemessen
+werden Laufzeit und Spitzen-Speicher je Pipeline-Stufe (Speicher in einem
+eigenen Lauf, da tracemalloc die Laufzeit verfälscht); mit --baseline wird
+gegen eine gespeicherte Messung verglichen. Kaltläufe leeren die
+prozessinternen Caches und die CSR-Netze; Kachel-Speicher und Places-SQLite
+im temporären Verzeichnis bleiben nach dem ersten Lauf erhalten, Overpass-
+und Places-Abrufe werden also nur im ersten Lauf mitgemessen. Der
+Overpass-Stub filtert nur räumlich, nicht nach Straßentypen. Szenarien, deren
+Suchkreis die Aufzeichnungen nicht abdecken, werden abgelehnt.
+
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json
+"""
+import os
+import re
+import sys
+import glob
+import json
+import math
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Szenarien: (Name, Breitengrad, Längengrad, Radius km, Routenpuffer km, Anzahl Suchbegriffe)
+# Die Aufzeichnungen in cache/ decken das Straßennetz um Schwerin bis etwa 24 km ab
+DEFAULT_SCENARIOS = [
+    ("schwerin_5km", 53.36, 11.60, 5, 2, 2),
+    ("schwerin_20km", 53.36, 11.60, 20, 2, 4),
+    ("schwerin_20km_alle_begriffe", 53.36, 11.60, 20, 2, 8),
+]
+
+STAGES = ["graph", "junctions", "places", "routing", "render"]
+
+
+def load_overpass_elements(cache_dir):
+    """Liest alle aufgezeichneten Overpass-Antworten und vereinigt die Elemente."""
+    nodes, ways = {}, {}
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for element in data.get("elements", []):
+            if element.get("type") == "node":
+                nodes[element["id"]] = element
+            elif element.get("type") == "way":
+                ways[element["id"]] = element
+    return nodes, ways
+
+
+def uncovered_scenarios(scenarios, nodes, ways):
+    """Szenarien, deren Suchkreis nicht im aufgezeichneten Straßennetz liegt.
+
+    Maßgeblich ist die Ausdehnung der Wege ohne Auffahrten (*_link), da diese
+    allein kein befahrbares Netz ergeben.
+    """
+    road_nodes = [nodes[n] for way in ways.values()
+                  if not way.get("tags", {}).get("highway", "").endswith("_link")
+                  for n in way.get("nodes", []) if n in nodes]
+    if not road_nodes:
+        return list(scenarios)
+    min_lat, max_lat = min(n["lat"] for n in road_nodes), max(n["lat"] for n in road_nodes)
+    min_lon, max_lon = min(n["lon"] for n in road_nodes), max(n["lon"] for n in road_nodes)
+
+    uncovered = []
+    for scenario in scenarios:
+        _, lat, lon, radius_km = scenario[:4]
+        dlat = radius_km / 111.32
+        dlon = radius_km / (111.32 * math.cos(math.radians(lat)))
+        if lat - dlat < min_lat or lat + dlat > max_lat or lon - dlon < min_lon or lon + dlon > max_lon:
+            uncovered.append(scenario)
+    return uncovered
+
+
+class OverpassStub(BaseHTTPRequestHandler):
+    """Beantwortet Overpass-Abfragen aus den aufgezeichneten Elementen (gefiltert auf die Abfrage-Box)."""
+
+    nodes = {}
+    ways = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, query):
+        coords = [float(v) for v in re.findall(r"-?\d+\.\d+", " ".join(re.findall(r"poly:['\"]([^'\"]+)['\"]", query)))]
+        if coords:
+            lats, lons = coords[0::2], coords[1::2]
+            box = (min(lats), max(lats), min(lons), max(lons))
+        else:
+            box = (-90, 90, -180, 180)
+
+        def inside(node):
+            return box[0] <= node["lat"] <= box[1] and box[2] <= node["lon"] <= box[3]
+
+        # Wege mit mindestens einem Knoten in der Box samt all ihrer Knoten ausliefern
+        ways = [way for way in self.ways.values()
+                if any(n in self.nodes and inside(self.nodes[n]) for n in way.get("nodes", []))]
+        node_ids = {n for way in ways for n in way["nodes"] if n in self.nodes}
+        body = json.dumps({
+            "version": 0.6,
+            "generator": "benchmark stub",
+            "elements": [self.nodes[n] for n in node_ids] + ways
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        self._respond(form.get("data", [""])[0])
+
+    def do_GET(self):
+        self._respond(parse_qs(urlparse(self.path).query).get("data", [""])[0])
+
+
+class PlacesStub(BaseHTTPRequestHandler):
+    """Beantwortet Nearby-Search-Anfragen aus einer Aufzeichnung oder mit deterministischen Märkten."""
+
+    recorded = None  # {Suchbegriff: [Places-Ergebnisse]}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        lat, lng = (float(v) for v in params.get("location", "0,0").split(","))
+        radius = float(params.get("radius", 1000))
+        keyword = params.get("keyword", "")
+
+        if self.recorded is not None:
+            results = [place for place in self.recorded.get(keyword, [])
+                       if _distance_m(lat, lng, place["geometry"]["location"]["lat"],
+                                      place["geometry"]["location"]["lng"]) <= radius]
+        else:
+            results = _synthetic_places(lat, lng, radius, keyword)
+
+        body = json.dumps({"status": "OK" if results else "ZERO_RESULTS", "results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 6371008.8 * 2 * math.asin(math.sqrt(a))
+
+
+def _synthetic_places(lat, lng, radius, keyword, count=20):
+    """Erzeugt reproduzierbare Märkte im Abfragekreis (Seed aus Suchbegriff und Position)."""
+    seed = hashlib.sha1(f"{keyword}|{lat:.5f}|{lng:.5f}|{radius:.0f}".encode("utf-8")).hexdigest()
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        distance = radius * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        dlat = distance * math.cos(bearing) / 111320.0
+        dlng = distance * math.sin(bearing) / (111320.0 * math.cos(math.radians(lat)))
+        results.append({
+            "place_id": f"{seed[:12]}-{i}",
+            "name": f"{keyword} {i + 1}",
+            "vicinity": f"Teststraße {i + 1}",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "geometry": {"location": {"lat": lat + dlat, "lng": lng + dlng}}
+        })
+    return results
+
+
+def start_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def configure_environment(workdir, places_url):
+    """Leitet alle Speicher in ein temporäres Verzeichnis um (vor dem Import der App)."""
+    os.environ.update({
+        "MAPS_API": "benchmark",
+        "PLACES_API_URL": places_url,
+        "PLACES_RATE_LIMIT_PER_S": "1000",
+        "PLACES_API_LIMIT": str(10 ** 9),
+        "GRAPH_STORE_DIR": os.path.join(workdir, "graph_store"),
+        "CSR_STORE_DIR": os.path.join(workdir, "graph_store", "csr"),
+        "PLACES_CACHE_DB": os.path.join(workdir, "places_cache.sqlite"),
+        "GEOCODE_CACHE_DB": os.path.join(workdir, "geocode_cache.sqlite"),
+        "USAGE_DB": os.path.join(workdir, "api_usage.sqlite"),
+        "RESULT_STORE_DB": os.path.join(workdir, "results.sqlite"),
+        "JOB_STORE_DB": os.path.join(workdir, "jobs.sqlite"),
+        "TRACE_LOGGING": "0",
+    })
+
+
+def configure_osmnx(overpass_url):
+    """Richtet osmnx auf den Overpass-Stub aus (osmnx 1.x und 2.x)."""
+    import osmnx as ox
+
+    ox.settings.use_cache = False
+    ox.settings.log_console = False
+    ox.settings.overpass_rate_limit = False
+    if hasattr(ox.settings, "overpass_url"):
+        ox.settings.overpass_url = overpass_url
+    else:
+        ox.settings.overpass_endpoint = overpass_url
+
+
+def reset_caches(webapp):
+    """Leert alle prozessinternen Caches, damit jeder Kaltlauf vollständig rechnet.
+
+    Kachel-Speicher und Places-SQLite bleiben erhalten; Kaltläufe messen also
+    das Laden von der Platte, nicht die Abrufe über die Stubs.
+    """
+    pipeline = webapp.get_pipeline()
+    pipeline.cache.clear()
+    pipeline.graph_cache.clear()
+    # CSR-Netze ebenfalls verwerfen, damit der Aufbau aus dem Straßennetz mitgemessen wird
+    if pipeline.csr_store is not None:
+        shutil.rmtree(pipeline.csr_store.store_dir, ignore_errors=True)
+        os.makedirs(pipeline.csr_store.store_dir, exist_ok=True)
+
+
+def fingerprint(result):
+    """Fachliche Kennzahlen eines Laufs zum Erkennen von Regressionen in Routing und Korridor-Filterung."""
+    features = result["geojson"]["features"]
+    routes = [f for f in features if f["properties"]["kind"] == "route"]
+    return {
+        "routes": len(routes),
+        "route_points": sum(len(f["geometry"]["coordinates"]) for f in routes),
+        "markets": len(result["markets"]),
+        "markets_per_direction": {
+            f["properties"]["direction"]: f["properties"]["markets_count"] for f in routes
+        }
+    }
+
+
+def measure_run(webapp, scenario, trace_memory=False):
+    """Ein Lauf des Szenarios; misst je Stufe entweder die Zeit oder (trace_memory) den Spitzen-Speicher."""
+    name, lat, lon, radius_km, route_radius_km, n_terms = scenario
+    terms = webapp.SEARCH_TERMS[:n_terms]
+    values = {}
+    state = {"stage": None, "start": None}
+
+    def close_stage():
+        if state["stage"] is not None:
+            if trace_memory:
+                values[state["stage"]] = tracemalloc.get_traced_memory()[1] / 1e6
+            else:
+                values[state["stage"]] = time.perf_counter() - state["start"]
+
+    def progress(stage):
+        close_stage()
+        if trace_memory:
+            tracemalloc.reset_peak()
+        state["stage"], state["start"] = stage, time.perf_counter()
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result, error = webapp.generate_map(lat, lon, radius_km, route_radius_km, terms,
+                                            progress=progress, output="geojson")
+        close_stage()
+        total = time.perf_counter() - start
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, error, total, values
+
+
+def run_scenario(webapp, scenario, repeat=3, cold=True):
+    """Führt ein Szenario mehrfach aus und misst Zeit (Minimum der Läufe) und
+    anschließend in einem eigenen Lauf den Spitzen-Speicher je Stufe."""
+    runs = []
+    for i in range(repeat):
+        if cold or i == 0:
+            reset_caches(webapp)
+        result, error, total, timings = measure_run(webapp, scenario)
+        if error:
+            return {"error": error}
+        runs.append({"total_s": total, "stages_s": timings, "fingerprint": fingerprint(result)})
+
+    # Speicher getrennt messen, damit tracemalloc die Zeiten nicht verfälscht
+    if cold:
+        reset_caches(webapp)
+    _, error, _, peaks = measure_run(webapp, scenario, trace_memory=True)
+    if error:
+        return {"error": error}
+
+    return {
+        "total_s": round(min(run["total_s"] for run in runs), 4),
+        "stages_s": {stage: round(min(run["stages_s"].get(stage, 0.0) for run in runs), 4) for stage in STAGES},
+        "peak_mb": {stage: round(peaks.get(stage, 0.0), 2) for stage in STAGES},
+        "fingerprint": runs[-1]["fingerprint"]
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Vergleicht mit einer gespeicherten Messung; gibt eine Liste von Regressionen zurück."""
+    problems = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None or "error" in reference:
+            continue
+        if "error" in current:
+            problems.append(f"{name}: Fehler {current['error']}")
+            continue
+        if current["fingerprint"] != reference["fingerprint"]:
+            problems.append(f"{name}: Ergebnis abweichend {reference['fingerprint']} -> {current['fingerprint']}")
+        for stage in STAGES:
+            before, after = reference["stages_s"].get(stage, 0.0), current["stages_s"].get(stage, 0.0)
+            # Sehr kurze Stufen schwanken stark und werden nicht bewertet
+            if before >= 0.05 and after > before * (1 + tolerance):
+                problems.append(f"{name}/{stage}: {before:.3f}s -> {after:.3f}s")
+            mem_before, mem_after = reference["peak_mb"].get(stage, 0.0), current["peak_mb"].get(stage, 0.0)
+            if mem_before >= 1 and mem_after > mem_before * (1 + tolerance):
+                problems.append(f"{name}/{stage}: {mem_before:.1f} MB -> {mem_after:.1f} MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline-Benchmark der Analyse-Pipeline")
+    parser.add_argument('--cache-dir', default='cache', help="Verzeichnis mit aufgezeichneten Overpass-Antworten")
+    parser.add_argument('--places-fixture', help="JSON-Datei {Suchbegriff: [Places-Ergebnisse]} statt erzeugter Märkte")
+    parser.add_argument('--scenario', action='append', help="Nur diese Szenarien ausführen")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warm', action='store_true', help="Caches zwischen den Wiederholungen behalten")
+    parser.add_argument('--baseline', help="Gespeicherte Messung zum Vergleich")
+    parser.add_argument('--save-baseline', help="Messung als neue Baseline speichern")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Erlaubte relative Verschlechterung")
+    parser.add_argument('--output', help="Messung zusätzlich als JSON schreiben")
+    args = parser.parse_args()
+
+    OverpassStub.nodes, OverpassStub.ways = load_overpass_elements(args.cache_dir)
+    scenarios = [s for s in DEFAULT_SCENARIOS if not args.scenario or s[0] in args.scenario]
+    uncovered = uncovered_scenarios(scenarios, OverpassStub.nodes, OverpassStub.ways)
+    if uncovered:
+        for scenario in uncovered:
+            print(f"❌ {scenario[0]}: Suchkreis ({scenario[3]} km) nicht durch {args.cache_dir}/ abgedeckt")
+        sys.exit(2)
+    if args.places_fixture:
+        with open(args.places_fixture, encoding="utf-8") as f:
+            PlacesStub.recorded = json.load(f)
+
+    _, overpass_url = start_server(OverpassStub)
+    _, places_url = start_server(PlacesStub)
+
+    with tempfile.TemporaryDirectory(prefix="routenanalyse_bench_") as workdir:
+        configure_environment(workdir, places_url)
+        import app as webapp
+        # Nach dem Laden der Pipeline, die eigene osmnx-Einstellungen setzt
+        webapp.get_pipeline()
+        configure_osmnx(overpass_url)
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario[0]] = result = run_scenario(webapp, scenario, repeat=args.repeat, cold=not args.warm)
+            if "error" in result:
+                print(f"❌ {scenario[0]}: {result['error']}")
+                continue
+            stages = "  ".join(f"{stage} {result['stages_s'][stage]:.3f}s/{result['peak_mb'][stage]:.0f}MB"
+                               for stage in STAGES)
+            print(f"⏱️  {scenario[0]}: {result['total_s']:.3f}s  ({stages})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ Baseline gespeichert: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"⚠️  {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ Keine Regressionen gegenüber der Baseline")
+
+
+if __name__ == '__main__':
+    main()
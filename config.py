@@ -17,6 +17,20 @@ class Config:
     "geocoding": int(os.environ.get('GEOCODING_API_LIMIT', 10000))
     }
     
+    # Places-API-Abfrage
+    PLACES_API_URL = os.environ.get('PLACES_API_URL', 'https://maps.googleapis.com/maps/api/place/nearbysearch/json')
+    PLACES_MAX_WORKERS = 8
+    PLACES_RATE_LIMIT_PER_S = int(os.environ.get('PLACES_RATE_LIMIT_PER_S', 10))
+    PLACES_TIMEOUT_S = 10
+    PLACES_MAX_PAGES = 3  # Google liefert max. 3 Seiten à 20 Ergebnisse
+    PLACES_MAX_RETRIES = 3
+    
+    # Places-Ergebnis-Cache (Raster, Zellgröße passend zum Suchradius)
+    PLACES_CACHE_DB = os.environ.get('PLACES_CACHE_DB', 'places_cache.sqlite')
+    PLACES_CACHE_TTL_HOURS = int(os.environ.get('PLACES_CACHE_TTL_HOURS', 168))
+    # Zellhöhen in Grad (≈ 8 bis 67 km); Zellen mindestens so groß wie der Suchkreis-Durchmesser
+    PLACES_GRID_LEVELS_DEG = (0.075, 0.15, 0.3, 0.6)
+    
     # Anwendungseinstellungen
     SEARCH_TERMS = [
         "Rewe", "EDEKA", "Markant", "Kaufland", 
@@ -28,12 +42,75 @@ class Config:
     MIN_RADIUS_KM = 5
     
     # Dateipfade
-    USAGE_FILE = "api_usage.json"
+    USAGE_FILE = "api_usage.json"  # Altformat, wird beim ersten Start übernommen
+    USAGE_DB = os.environ.get('USAGE_DB', 'api_usage.sqlite')
     
     # OSM-Einstellungen
-    HIGHWAY_VALUES = ["motorway_link", "trunk_link"]
+    HIGHWAY_VALUES = ["motorway_link", "trunk_link", "motorway_junction"]
     FALLBACK_HIGHWAY_TYPES = ["motorway", "trunk", "primary", "motorway_junction"]
     ROUTE_BUFFER_M = 2000
+    ROUTE_SIMPLIFY_TOLERANCE_M = 25  # Vereinfachung der Routen vor dem Puffern
+    EXIT_SECTORS = 8  # Anzahl der Richtungssektoren für die Anschlussstellen-Auswahl
+    # Ausfahrtswahl je Sektor: "sector" (Luftlinie) oder "network" (Straßendistanz aus begrenzter Suche)
+    EXIT_SELECTION_MODE = os.environ.get('EXIT_SELECTION_MODE', 'sector')
+    EXIT_NETWORK_CUTOFF_FACTOR = 1.5  # Höchste Suchgrenze im Netzwerk-Modus als Vielfaches des Suchradius
+    EXIT_NETWORK_DETOUR_FACTOR = 1.3  # Erste Suchgrenze: Umwegfaktor auf die Luftlinie der fernsten Sektor-Anschlussstelle
+    ISOCHRONE_GRID_M = 250  # Rasterweite zum Ausdünnen der erreichten Knoten vor der Hüllenbildung
+    ISOCHRONE_HULL_RATIO = 0.2  # Konkavität der Isochrone (0 = eng anliegend, 1 = konvexe Hülle)
+    
+    # Straßennetz-Kachelspeicher
+    GRAPH_STORE_DIR = os.environ.get('GRAPH_STORE_DIR', 'graph_store')
+    GRAPH_TILE_SIZE_DEG = 0.5
+    GRAPH_STORE_MAX_MB = int(os.environ.get('GRAPH_STORE_MAX_MB', 2048))
+    GRAPH_DETAIL_TILE_SIZE_DEG = 0.1  # Feinere Kacheln für Nahbereich und Korridore
+    
+    # Kompakte CSR-Routing-Netze (NumPy-Arrays, per Memory-Mapping geladen)
+    CSR_STORE_DIR = os.environ.get('CSR_STORE_DIR', os.path.join(GRAPH_STORE_DIR, 'csr'))
+    CSR_STORE_MAX_MB = int(os.environ.get('CSR_STORE_MAX_MB', 1024))
+    
+    # Gestaffeltes Laden: "staged" (Hauptstraßen + Detail nahe Festival/Korridoren) oder "full"
+    GRAPH_LOADING_MODE = os.environ.get('GRAPH_LOADING_MODE', 'staged')
+    GRAPH_LOCAL_RADIUS_KM = 10
+    GRAPH_CORRIDOR_WIDTH_M = 3000
+    
+    # Speicherbudget je Prozess für aufgebaute Straßennetze und Zwischenergebnisse der Pipeline
+    GRAPH_CACHE_MAX_MB = int(os.environ.get('GRAPH_CACHE_MAX_MB', 1024))
+    GRAPH_CACHE_PRECISION = 2  # Nachkommastellen für das gerundete Zentrum (~1 km)
+    
+    # Geocoding-Cache
+    GEOCODE_CACHE_DB = os.environ.get('GEOCODE_CACHE_DB', 'geocode_cache.sqlite')
+    GEOCODE_CACHE_TTL_DAYS = 365
+    GEOCODE_MAX_WORKERS = 8
+    GEOCODE_BATCH_MAX = 500
+    
+    # Cache für Zwischenergebnisse der Analyse-Pipeline (je Prozess, Speicher zählt gegen GRAPH_CACHE_MAX_MB)
+    PIPELINE_CACHE_ENTRIES = 256
+    PIPELINE_CACHE_TTL_S = 3600
+    
+    # Start und Vorwärmen (gunicorn mit preload, siehe wsgi.py)
+    OSMNX_CACHE_DIR = os.environ.get('OSMNX_CACHE_DIR', 'cache')
+    # Optional "lat,lon,radius_km": Straßennetz dieser Region beim Start laden
+    WARMUP_REGION = tuple(float(v) for v in os.environ['WARMUP_REGION'].split(',')) if os.environ.get('WARMUP_REGION') else None
+    
+    # Instrumentierung: strukturierte Traces je Lauf, Profiling per Header X-Profile
+    TRACE_LOGGING = os.environ.get('TRACE_LOGGING', '1') == '1'
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    
+    # Serverseitiger Ergebnis-Speicher
+    RESULT_STORE_DB = os.environ.get('RESULT_STORE_DB', 'results.sqlite')
+    RESULT_TTL_HOURS = 24
+    RESULT_MAX_COUNT = 1000
+    
+    # Hintergrund-Jobs für die Kartenerstellung
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_TTL_S = 3600  # Abgeschlossene Jobs so lange abrufbar halten
+    JOB_STORE_DB = os.environ.get('JOB_STORE_DB', 'jobs.sqlite')  # Job-Status, von allen Worker-Prozessen geteilt
+    
+    # Batch-Analyse mehrerer Standorte
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 2))
+    BATCH_REGION_DEG = 0.5  # Standorte in derselben Rasterzelle teilen sich einen Worker
+    BATCH_MAX_SITES = 200
+    BATCH_OUTPUT_DIR = os.environ.get('BATCH_OUTPUT_DIR', 'batch_output')
     
     # Session-Einstellungen
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
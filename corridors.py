@@ -0,0 +1,35 @@
+import numpy as np
+import shapely
+
+
+def corridor_membership(route_lines, market_points, buffer_m):
+    """Ordnet Märkte den Routenkorridoren zu (alle Geometrien in einem metrischen KBS).
+
+    Die Märkte werden in einem STRtree indiziert und alle Korridore mit einer
+    einzigen Bulk-Abfrage geprüft. Rückgabe:
+      - membership: bool-Matrix Märkte × Routen
+      - distances_m: Abstand jedes Markts zu jeder Route in Metern
+      - corridors: gepufferte Routen (Polygone)
+    """
+    routes = np.asarray(route_lines, dtype=object)
+    markets = np.asarray(market_points, dtype=object)
+    n_markets, n_routes = len(markets), len(routes)
+
+    membership = np.zeros((n_markets, n_routes), dtype=bool)
+    corridors = shapely.buffer(routes, buffer_m) if n_routes else routes
+    if n_markets == 0 or n_routes == 0:
+        return {
+            "membership": membership,
+            "distances_m": np.empty((n_markets, n_routes)),
+            "corridors": corridors
+        }
+
+    tree = shapely.STRtree(markets)
+    route_idx, market_idx = tree.query(corridors, predicate="contains")
+    membership[market_idx, route_idx] = True
+
+    return {
+        "membership": membership,
+        "distances_m": shapely.distance(markets[:, np.newaxis], routes[np.newaxis, :]),
+        "corridors": corridors
+    }
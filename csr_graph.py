@@ -0,0 +1,228 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+# Kleinste Kantenlänge: csgraph behandelt Gewichte von 0 als fehlende Kante
+MIN_EDGE_LENGTH_M = 0.01
+EARTH_RADIUS_M = 6371008.8
+
+ARRAY_NAMES = ["node_ids", "x", "y", "indptr", "indices", "weights",
+               "junction_lons", "junction_lats", "junction_types"]
+
+
+def unit_vectors(lons, lats):
+    """Punkte als Einheitsvektoren (x, y, z); die euklidische Distanz ist dann die Sehne auf der Kugel."""
+    lon_rad = np.radians(np.atleast_1d(np.asarray(lons, dtype=np.float64)))
+    lat_rad = np.radians(np.atleast_1d(np.asarray(lats, dtype=np.float64)))
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+class CSRGraph:
+    """Kompaktes Routing-Netz im CSR-Format (compressed sparse row) auf NumPy-Arrays.
+
+    Knoten sind nach OSM-ID sortiert und über int32-Indizes adressiert; je
+    Knotenpaar bleibt nur die kürzeste Kante (float32-Länge in Metern).
+    Zusätzlich werden die Anschlussstellen-Kandidaten mitgeführt, sodass für
+    Routing und Ausfahrtswahl der osmnx-Graph nicht mehr benötigt wird.
+    Die Arrays lassen sich speichern und per Memory-Mapping laden.
+    """
+
+    def __init__(self, node_ids, x, y, indptr, indices, weights,
+                 junction_lons=None, junction_lats=None, junction_types=None):
+        self.node_ids = node_ids
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.junction_lons = junction_lons if junction_lons is not None else np.empty(0)
+        self.junction_lats = junction_lats if junction_lats is not None else np.empty(0)
+        self.junction_types = junction_types if junction_types is not None else np.empty(0, dtype=str)
+        self._matrix = None
+        self._node_tree = None
+
+    @classmethod
+    def from_networkx(cls, G, weight="length", junctions=None):
+        """Wandelt einen osmnx-Graphen in einen CSR-Graphen um (ein Durchlauf über Knoten und Kanten)."""
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+        order = np.argsort(node_ids)
+        node_ids = node_ids[order]
+        x = np.array([G.nodes[n]["x"] for n in node_ids], dtype=np.float64)
+        y = np.array([G.nodes[n]["y"] for n in node_ids], dtype=np.float64)
+
+        n_edges = G.number_of_edges()
+        edge_u = np.empty(n_edges, dtype=np.int64)
+        edge_v = np.empty(n_edges, dtype=np.int64)
+        lengths = np.empty(n_edges, dtype=np.float64)
+        for i, (u, v, length) in enumerate(G.edges(data=weight, default=0.0)):
+            edge_u[i], edge_v[i], lengths[i] = u, v, length
+        sources = np.searchsorted(node_ids, edge_u).astype(np.int32)
+        targets = np.searchsorted(node_ids, edge_v).astype(np.int32)
+        lengths = np.maximum(lengths, MIN_EDGE_LENGTH_M).astype(np.float32)
+
+        # Parallelkanten auf die kürzeste reduzieren, dann nach Startknoten sortieren
+        order = np.lexsort((lengths, targets, sources))
+        sources, targets, lengths = sources[order], targets[order], lengths[order]
+        keep = np.ones(len(sources), dtype=bool)
+        keep[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        sources, targets, lengths = sources[keep], targets[keep], lengths[keep]
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+
+        junction_lons, junction_lats, junction_types = junctions if junctions is not None else (None, None, None)
+        return cls(node_ids, x, y, indptr, targets, lengths,
+                   junction_lons=None if junction_lons is None else np.asarray(junction_lons, dtype=np.float64),
+                   junction_lats=None if junction_lats is None else np.asarray(junction_lats, dtype=np.float64),
+                   junction_types=None if junction_types is None else np.asarray(junction_types, dtype=str))
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def matrix(self):
+        """Gewichtete Adjazenzmatrix für scipy.sparse.csgraph.
+
+        scipy rechnet intern mit float64 und würde die float32-Gewichte bei
+        jedem Aufruf umwandeln; die Matrix hält deshalb einmalig eine
+        float64-Kopie der Gewichte, Indizes und Zeiger werden geteilt.
+        """
+        if self._matrix is None:
+            from scipy.sparse import csr_matrix
+
+            self._matrix = csr_matrix((self.weights.astype(np.float64), self.indices, self.indptr),
+                                      shape=(self.n_nodes, self.n_nodes), copy=False)
+        return self._matrix
+
+    def index_of(self, osm_ids):
+        """Bildet OSM-Knoten-IDs auf Indizes ab."""
+        return np.searchsorted(self.node_ids, np.asarray(osm_ids, dtype=np.int64))
+
+    def node_tree(self):
+        """KD-Baum über alle Knoten (Einheitsvektoren); wird einmal je Graph aufgebaut und wiederverwendet."""
+        if self._node_tree is None:
+            from scipy.spatial import cKDTree
+
+            self._node_tree = cKDTree(unit_vectors(self.x, self.y))
+        return self._node_tree
+
+    def nearest_nodes(self, lons, lats, return_dist=False):
+        """Indizes der nächstgelegenen Knoten für beliebig viele Punkte in einer Abfrage.
+
+        Mit return_dist=True zusätzlich die Großkreis-Distanzen in Metern.
+        """
+        chords, nearest = self.node_tree().query(unit_vectors(lons, lats))
+        nearest = np.asarray(nearest, dtype=np.int64)
+        if return_dist:
+            return nearest, 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(np.asarray(chords) / 2, 1.0))
+        return nearest
+
+    def coords(self, indices):
+        """Gibt (Längengrade, Breitengrade) der Knoten-Indizes zurück."""
+        indices = np.asarray(indices)
+        return np.asarray(self.x[indices]), np.asarray(self.y[indices])
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    def memory_bytes(self):
+        """Geschätzter Prozess-Speicher: nicht eingeblendete Arrays plus float64-Matrix und KD-Baum.
+
+        Matrix und Baum werden mitgezählt, auch wenn sie noch nicht aufgebaut
+        sind, da jede Analyse beide benötigt. Eingeblendete Arrays liegen im
+        Seiten-Cache des Betriebssystems und zählen nicht.
+        """
+        arrays = (getattr(self, name) for name in ARRAY_NAMES)
+        size = sum(array.nbytes for array in arrays if not isinstance(array, np.memmap))
+        # float64-Gewichte der Matrix; KD-Baum mit Kopie der Einheitsvektoren, Indizes und Baumknoten
+        return size + self.n_edges * 8 + self.n_nodes * 40
+
+    def save(self, directory):
+        """Speichert alle Arrays als .npy-Dateien in ein Verzeichnis."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Lädt einen gespeicherten Graphen; mit mmap=True werden die Arrays nur eingeblendet."""
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAY_NAMES}
+        return cls(**arrays)
+
+
+class CSRStore:
+    """Festplatten-Speicher für CSR-Graphen (ein Verzeichnis je Schlüssel, LRU nach Zugriffszeit).
+
+    Mehrere Worker-Prozesse blenden dieselben Dateien ein und teilen sich so
+    den Speicher über den Seiten-Cache des Betriebssystems.
+    """
+
+    def __init__(self, store_dir, max_size_mb=1024):
+        self.store_dir = store_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.store_dir, hashlib.sha1(repr(key).encode("utf-8")).hexdigest())
+
+    def get(self, key):
+        """Lädt den Graphen zum Schlüssel (memory-mapped) oder gibt None zurück."""
+        path = self.path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            csr = CSRGraph.load(path)
+        except (OSError, ValueError):
+            return None
+        # Zugriffszeit als LRU-Marker
+        os.utime(path, None)
+        return csr
+
+    def put(self, key, csr):
+        """Speichert einen Graphen atomar (temporäres Verzeichnis, dann umbenennen)."""
+        path = self.path(key)
+        tmp_dir = tempfile.mkdtemp(dir=self.store_dir, prefix=".tmp_")
+        try:
+            csr.save(tmp_dir)
+            os.replace(tmp_dir, path)
+        except OSError:
+            # Ein anderer Prozess war schneller
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.store_dir):
+            if entry.is_dir() and not entry.name.startswith("."):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Entfernt die am längsten nicht genutzten Graphen, bis das Größenlimit eingehalten ist."""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_size_bytes:
+                    break
+                # Eingeblendete Dateien bleiben für laufende Prozesse gültig (Unix)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+            return removed
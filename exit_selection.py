@@ -0,0 +1,132 @@
+import numpy as np
+import shapely
+
+EARTH_RADIUS_KM = 6371.0088
+
+COMPASS_LABELS = {
+    4: ["N", "E", "S", "W"],
+    8: ["N", "NE", "E", "SE", "S", "SW", "W", "NW"],
+    16: ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+         "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+}
+
+
+def _highway_tags(value):
+    """Normalisiert das highway-Attribut (nach der Vereinfachung ggf. eine Liste) zu einer Menge."""
+    if isinstance(value, (list, tuple, set)):
+        return set(value)
+    return {value} if value else set()
+
+
+def junction_candidates(G, highway_values, fallback_types):
+    """Sammelt Anschlussstellen-Kandidaten in einem Durchlauf über den geladenen Graphen.
+
+    Ein Wert aus highway_values trifft auf Kanten (Mittelpunkt, z.B. motorway_link)
+    oder Knoten (z.B. motorway_junction) zu. Gibt es keinen Treffer, werden
+    Kreuzungen (Grad >= 3) auf Straßen der fallback_types verwendet.
+    Rückgabe: (Längengrade, Breitengrade, Typen) als Arrays.
+    """
+    values = set(highway_values)
+    fallback = set(fallback_types)
+    lons, lats, types = [], [], []
+    fallback_nodes = set()
+
+    for node_id, data in G.nodes(data=True):
+        tags = _highway_tags(data.get('highway'))
+        matched = tags & values
+        if matched:
+            lons.append(data['x'])
+            lats.append(data['y'])
+            types.append(min(matched))
+        elif tags & fallback:
+            fallback_nodes.add(node_id)
+
+    seen_edges = set()
+    edge_geometries, edge_positions = [], []
+    for u, v, data in G.edges(data=True):
+        tags = _highway_tags(data.get('highway'))
+        matched = tags & values
+        if matched:
+            # Gegenrichtung und Parallelkanten nur einmal zählen
+            edge = (u, v) if u <= v else (v, u)
+            if edge in seen_edges:
+                continue
+            seen_edges.add(edge)
+            # Vereinfachte Kanten: Mitte entlang der Geometrie, sonst liegt der Punkt ggf. abseits der Straße
+            if data.get('geometry') is not None:
+                edge_geometries.append(data['geometry'])
+                edge_positions.append(len(lons))
+            lons.append((G.nodes[u]['x'] + G.nodes[v]['x']) / 2)
+            lats.append((G.nodes[u]['y'] + G.nodes[v]['y']) / 2)
+            types.append(min(matched))
+        elif tags & fallback:
+            fallback_nodes.add(u)
+            fallback_nodes.add(v)
+
+    if edge_geometries:
+        midpoints = shapely.line_interpolate_point(np.array(edge_geometries, dtype=object), 0.5, normalized=True)
+        for position, x, y in zip(edge_positions, shapely.get_x(midpoints), shapely.get_y(midpoints)):
+            lons[position], lats[position] = x, y
+
+    if not lons:
+        for node_id in fallback_nodes:
+            if G.degree[node_id] >= 3:
+                lons.append(G.nodes[node_id]['x'])
+                lats.append(G.nodes[node_id]['y'])
+                types.append("network_junction")
+
+    return np.array(lons, dtype=float), np.array(lats, dtype=float), np.array(types, dtype=object)
+
+
+def haversine_km(lat0, lon0, lats, lons):
+    """Großkreis-Distanzen vom Punkt (lat0, lon0) zu allen Punkten in Kilometern."""
+    phi0 = np.radians(lat0)
+    phi = np.radians(lats)
+    dphi = phi - phi0
+    dlon = np.radians(np.asarray(lons) - lon0)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi0) * np.cos(phi) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def bearings(lat0, lon0, lats, lons):
+    """Peilungen vom Punkt (lat0, lon0) zu allen Punkten in Grad (0-360)."""
+    phi1 = np.radians(lat0)
+    phi2 = np.radians(lats)
+    dlon = np.radians(np.asarray(lons) - lon0)
+    x = np.sin(dlon) * np.cos(phi2)
+    y = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlon)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def sector_labels(n_sectors):
+    """Bezeichnungen der Sektoren (Himmelsrichtungen oder Mittelwinkel in Grad)."""
+    if n_sectors in COMPASS_LABELS:
+        return COMPASS_LABELS[n_sectors]
+    width = 360.0 / n_sectors
+    return [f"{i * width:.0f}°" for i in range(n_sectors)]
+
+
+def bearing_sectors(bearing_values, n_sectors=8):
+    """Ordnet Peilungen Sektoren zu; Sektor 0 ist um Norden zentriert."""
+    width = 360.0 / n_sectors
+    shifted = (np.asarray(bearing_values) + width / 2) % 360
+    edges = np.arange(1, n_sectors) * width
+    return np.digitize(shifted, edges)
+
+
+def nearest_per_sector(sectors, distances):
+    """Gibt pro Sektor den Index des nächstgelegenen Punkts zurück (Groupby-Argmin)."""
+    sectors = np.asarray(sectors)
+    if len(sectors) == 0:
+        return np.array([], dtype=int)
+    order = np.lexsort((np.asarray(distances), sectors))
+    _, first = np.unique(sectors[order], return_index=True)
+    return order[first]
+
+
+def assign_sectors(lat0, lon0, lats, lons, n_sectors=8):
+    """Berechnet Distanz (km), Peilung und Sektor aller Punkte relativ zum Zentrum."""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    bearing_values = bearings(lat0, lon0, lats, lons)
+    return haversine_km(lat0, lon0, lats, lons), bearing_values, bearing_sectors(bearing_values, n_sectors)
@@ -0,0 +1,113 @@
+import io
+import csv
+import json
+
+# Exportspalten: (Schlüssel, Überschrift)
+EXPORT_COLUMNS = [
+    ("name", "Marktname"),
+    ("vicinity", "Adresse"),
+    ("search_keyword", "Suchbegriff"),
+    ("direction", "Richtung"),
+    ("distance_m", "Abstand zur Route (m)"),
+    ("lat", "Breitengrad"),
+    ("lng", "Längengrad"),
+    ("rating", "Bewertung")
+]
+
+EXPORT_FORMATS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv": ("text/csv", "csv"),  # Werkzeug ergänzt "; charset=utf-8"
+    "geojson": ("application/geo+json", "geojson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+# Breite für Zahlenspalten (Koordinaten, Abstände, Bewertungen)
+NUMERIC_WIDTH = 12
+
+
+def unique_markets(rows):
+    """Überspringt Märkte, die bereits mit gleichem Namen und gleicher Adresse vorkamen."""
+    seen = set()
+    for row in rows:
+        key = (row.get("name"), row.get("vicinity"))
+        if key not in seen:
+            seen.add(key)
+            yield row
+
+
+def column_widths(columns, max_lengths):
+    """Spaltenbreiten aus den beim Speichern mitgeführten Maximallängen (ohne zweiten Durchlauf)."""
+    widths = []
+    for key, header in columns:
+        length = max(len(header), max_lengths.get(key, NUMERIC_WIDTH))
+        widths.append((length + 2) * 1.2)
+    return widths
+
+
+def write_xlsx(target, sheets):
+    """Schreibt Tabellenblätter zeilenweise im Write-Only-Modus von openpyxl.
+
+    sheets ist eine Liste von (Titel, Spalten, Zeilen, Maximallängen); die Zeilen
+    dürfen ein Generator sein, es wird nie das ganze Blatt im Speicher gehalten.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for title, columns, rows, max_lengths in sheets:
+        worksheet = workbook.create_sheet(title)
+        # Im Write-Only-Modus müssen die Breiten vor der ersten Zeile gesetzt werden
+        for i, width in enumerate(column_widths(columns, max_lengths), start=1):
+            worksheet.column_dimensions[get_column_letter(i)].width = width
+        worksheet.append([header for _, header in columns])
+        for row in rows:
+            worksheet.append([row.get(key) for key, _ in columns])
+    workbook.save(target)
+
+
+def iter_csv(rows, columns=EXPORT_COLUMNS, chunk_rows=500):
+    """Erzeugt eine CSV-Datei (Semikolon, UTF-8 mit BOM für Excel) in Blöcken."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    writer.writerow([header for _, header in columns])
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(["" if row.get(key) is None else row.get(key) for key, _ in columns])
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_geojson(rows, columns=EXPORT_COLUMNS):
+    """Erzeugt eine GeoJSON-FeatureCollection der Märkte Feature für Feature."""
+    yield '{"type": "FeatureCollection", "features": ['
+    for i, row in enumerate(rows):
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [row["lng"], row["lat"]]},
+            "properties": {key: row.get(key) for key, _ in columns if key not in ("lat", "lng")}
+        }
+        yield ("," if i else "") + json.dumps(feature, ensure_ascii=False)
+    yield ']}'
+
+
+def write_parquet(target, rows, columns=EXPORT_COLUMNS, batch_rows=10000):
+    """Schreibt die Märkte blockweise als Parquet-Datei (benötigt pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (key, pa.float64() if key in ("lat", "lng", "distance_m", "rating") else pa.string())
+        for key, _ in columns
+    ])
+    with pq.ParquetWriter(target, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
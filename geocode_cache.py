@@ -0,0 +1,75 @@
+import re
+import json
+import time
+import sqlite3
+
+UMLAUT_MAP = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def normalize_address(address):
+    """Normalisiert eine Adresse als Cache-Schlüssel (Groß-/Kleinschreibung, Leerzeichen, Umlaute)."""
+    text = str(address).casefold().translate(UMLAUT_MAP)
+    # "Str." auch am Ende zusammengesetzter Namen ("Hauptstr. 5" -> "hauptstrasse 5")
+    text = re.sub(r"str\.(?=[\s\d,;]|$)", "strasse", text)
+    text = re.sub(r"[,;]+", " ", text)
+    return " ".join(text.split())
+
+
+class GeocodeCache:
+    """Persistenter Geocoding-Cache (SQLite) mit normalisierten Adress-Schlüsseln.
+
+    Über die gerundeten Koordinaten ist zusätzlich eine Rückwärtssuche möglich.
+    Es werden nur erfolgreiche Ergebnisse gespeichert.
+    """
+
+    def __init__(self, db_path, ttl_days=365, coord_precision=4):
+        self.db_path = db_path
+        self.ttl_s = ttl_days * 86400
+        self.coord_precision = coord_precision
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_cache ("
+                " address_key TEXT PRIMARY KEY, lat_key REAL, lng_key REAL,"
+                " fetched_at REAL NOT NULL, result TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_geocode_coords ON geocode_cache (lat_key, lng_key)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, address):
+        """Gibt das gecachte Ergebnis für eine Adresse zurück oder None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM geocode_cache WHERE address_key = ? AND fetched_at >= ?",
+                (normalize_address(address), time.time() - self.ttl_s)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, addresses):
+        """Gibt {Adresse: Ergebnis} für alle gecachten Adressen zurück."""
+        return {address: result for address in addresses if (result := self.get(address)) is not None}
+
+    def put(self, address, result):
+        """Speichert ein erfolgreiches Geocoding-Ergebnis."""
+        if result.get("status") != "OK":
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?)",
+                (normalize_address(address),
+                 round(result["lat"], self.coord_precision),
+                 round(result["lng"], self.coord_precision),
+                 time.time(),
+                 json.dumps(result))
+            )
+
+    def reverse(self, lat, lng):
+        """Sucht ein gecachtes Ergebnis über die gerundeten Koordinaten."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM geocode_cache WHERE lat_key = ? AND lng_key = ? AND fetched_at >= ?"
+                " ORDER BY fetched_at DESC LIMIT 1",
+                (round(lat, self.coord_precision), round(lng, self.coord_precision), time.time() - self.ttl_s)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,67 @@
+import numpy as np
+import pyproj
+import shapely
+
+
+class LocalProjection:
+    """Lokale metrische Projektion (azimutal abstandstreu) um einen Mittelpunkt.
+
+    Abstände vom Mittelpunkt sind exakt, im Umkreis von 100 km ist die
+    Verzerrung vernachlässigbar – anders als bei Web Mercator (Faktor 1/cos(lat)).
+    Alle Transformationen arbeiten vektorisiert auf Koordinaten-Arrays.
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+        self.crs = pyproj.CRS.from_proj4(f"+proj=aeqd +lat_0={lat} +lon_0={lon} +datum=WGS84 +units=m")
+        self._to_metric = pyproj.Transformer.from_crs("EPSG:4326", self.crs, always_xy=True)
+        self._to_wgs = pyproj.Transformer.from_crs(self.crs, "EPSG:4326", always_xy=True)
+
+    def to_metric_xy(self, lons, lats):
+        """Projiziert Längen-/Breitengrad-Arrays nach x/y in Metern."""
+        return self._to_metric.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+
+    def to_wgs_xy(self, xs, ys):
+        """Projiziert x/y-Arrays in Metern zurück nach Längen-/Breitengrad."""
+        return self._to_wgs.transform(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+
+    def to_metric(self, geometries):
+        """Projiziert Shapely-Geometrien (einzeln oder als Array) ins metrische System."""
+        return shapely.transform(geometries, lambda c: np.column_stack(self.to_metric_xy(c[:, 0], c[:, 1])))
+
+    def to_wgs(self, geometries):
+        """Projiziert metrische Shapely-Geometrien zurück nach WGS84."""
+        return shapely.transform(geometries, lambda c: np.column_stack(self.to_wgs_xy(c[:, 0], c[:, 1])))
+
+    def circle(self, radius_m):
+        """Kreis mit echtem Radius in Metern um den Mittelpunkt (als WGS84-Polygon)."""
+        return self.to_wgs(shapely.buffer(shapely.points(0.0, 0.0), radius_m))
+
+    def buffer_wgs(self, geometry, distance_m):
+        """Puffert eine WGS84-Geometrie um distance_m Meter."""
+        return self.to_wgs(shapely.buffer(self.to_metric(geometry), distance_m))
+
+    def hull(self, lons, lats, ratio=0.2, grid_m=0.0):
+        """Konkave Hülle einer Punktmenge als WGS84-Polygon; grid_m dünnt die Punkte vorher auf ein Raster aus.
+
+        Gibt None zurück, wenn die (ausgedünnten) Punkte keine Fläche aufspannen.
+        """
+        xs, ys = self.to_metric_xy(lons, lats)
+        coords = np.unique(np.column_stack((xs, ys)), axis=0)
+        if grid_m and len(coords):
+            coords = np.unique(np.round(coords / grid_m), axis=0) * grid_m
+        if len(coords) < 3:
+            return None
+        hull = shapely.concave_hull(shapely.multipoints(coords), ratio=ratio)
+        if hull.geom_type not in ("Polygon", "MultiPolygon") or hull.is_empty:
+            return None
+        return self.to_wgs(hull)
+
+    def route_lines(self, coord_arrays, tolerance_m=0.0):
+        """Baut metrische Routen-Linien aus (Längengrade, Breitengrade)-Arrays und vereinfacht sie."""
+        lines = np.array([shapely.linestrings(*self.to_metric_xy(lons, lats)) for lons, lats in coord_arrays],
+                         dtype=object)
+        if tolerance_m and len(lines):
+            lines = shapely.simplify(lines, tolerance_m)
+        return lines
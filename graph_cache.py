@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+import networkx as nx
+
+from geodesy import haversine_km
+from graph_store import truncate_graph_polygon
+
+
+def estimate_graph_bytes(G):
+    """Grobe Schätzung des Speicherbedarfs eines osmnx-Graphen."""
+    # Erfahrungswerte für Python-Dicts mit OSM-Attributen und Geometrien
+    return G.number_of_nodes() * 600 + G.number_of_edges() * 1500
+
+
+class GraphCache:
+    """In-Prozess-LRU-Cache für fertig aufgebaute Straßennetze.
+
+    Schlüssel ist das gerundete Zentrum plus Radius. Liegt ein angefragter
+    Kreis vollständig in einem gecachten Graphen, wird daraus ein Teilgraph
+    geschnitten statt neu zu laden. Das gilt nur für vollständig geladene Netze
+    (mode "full"); gestaffelte Netze sind nur um ihr eigenes Zentrum detailliert.
+    Gecachte Graphen dürfen nicht verändert werden.
+    """
+
+    def __init__(self, max_size_mb=1024, precision=2):
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.precision = precision
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        # Belegung anderer Caches, die sich das Budget teilen (siehe AnalysisPipeline)
+        self.shared_bytes = lambda: 0
+
+    def _key(self, lat, lon, radius_km, mode):
+        return round(lat, self.precision), round(lon, self.precision), float(radius_km), mode
+
+    def get(self, lat, lon, radius_km, polygon=None, mode="full"):
+        """Gibt einen passenden Graphen zurück oder None."""
+        key = self._key(lat, lon, radius_km, mode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry['graph']
+
+            # Gecachten Graphen suchen, der den angefragten Kreis vollständig enthält
+            container = None
+            if polygon is not None:
+                for cached_key, cached in reversed(self._entries.items()):
+                    if cached['mode'] != "full":
+                        continue
+                    dist_km = haversine_km(lat, lon, cached['lat'], cached['lon'])
+                    if dist_km + radius_km <= cached['radius_km']:
+                        container = cached
+                        self._entries.move_to_end(cached_key)
+                        break
+
+        if container is None:
+            return None
+
+        G = truncate_graph_polygon(container['graph'], polygon)
+        largest = max(nx.weakly_connected_components(G), key=len)
+        G = G.subgraph(largest).copy()
+        self.put(lat, lon, radius_km, G, mode)
+        return G
+
+    def put(self, lat, lon, radius_km, G, mode="full"):
+        """Legt einen Graphen im Cache ab und verdrängt ggf. alte Einträge."""
+        key = self._key(lat, lon, radius_km, mode)
+        size = estimate_graph_bytes(G)
+        if size > self.max_size_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size_bytes -= old['size']
+
+            self._entries[key] = {
+                'graph': G,
+                'lat': lat,
+                'lon': lon,
+                'radius_km': float(radius_km),
+                'mode': mode,
+                'size': size
+            }
+            self._size_bytes += size
+
+            while self._size_bytes + self.shared_bytes() > self.max_size_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= evicted['size']
+
+    def size_bytes(self):
+        """Geschätzte Belegung in Bytes (ohne Sperre, für das geteilte Budget)."""
+        return self._size_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self):
+        """Kennzahlen des Caches."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._size_bytes / (1024 * 1024), 1),
+                "max_size_mb": round(self.max_size_bytes / (1024 * 1024), 1)
+            }
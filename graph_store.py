@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import pickle
+import argparse
+import threading
+
+import numpy as np
+import networkx as nx
+import osmnx as ox
+import shapely
+from shapely.geometry import box
+
+
+def truncate_graph_polygon(G, polygon, truncate_by_edge=True):
+    """Schneidet den Graphen auf ein (ggf. mehrteiliges) Polygon zu, ohne Komponenten zu verwerfen.
+
+    Mit truncate_by_edge bleiben Kanten erhalten, die die Polygongrenze kreuzen.
+    """
+    node_ids = np.array(list(G.nodes), dtype=object)
+    if len(node_ids) == 0:
+        return G.copy()
+    xs = np.array([G.nodes[n]['x'] for n in node_ids], dtype=float)
+    ys = np.array([G.nodes[n]['y'] for n in node_ids], dtype=float)
+    keep = set(node_ids[shapely.contains_xy(polygon, xs, ys)])
+
+    if truncate_by_edge:
+        boundary_nodes = set()
+        for u, v in G.edges():
+            if (u in keep) != (v in keep):
+                boundary_nodes.add(u)
+                boundary_nodes.add(v)
+        keep |= boundary_nodes
+
+    return G.subgraph(keep).copy()
+
+
+class TileGraphStore:
+    """Persistenter Kachel-Speicher für OSM-Straßennetze.
+
+    Das Netz wird in feste Kacheln (Gradraster) aufgeteilt. Jede Kachel wird
+    einmal geladen, unvereinfacht als Pickle gespeichert und für beliebige
+    Polygone wieder zusammengesetzt.
+    """
+
+    def __init__(self, store_dir, tile_size_deg=0.5, max_size_mb=2048, network_type='drive'):
+        self.store_dir = store_dir
+        self.tile_size_deg = tile_size_deg
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.network_type = network_type
+        self._lock = threading.Lock()
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def tile_bounds(self, tile):
+        """Gibt (west, süd, ost, nord) einer Kachel zurück."""
+        iy, ix = tile
+        size = self.tile_size_deg
+        return ix * size, iy * size, (ix + 1) * size, (iy + 1) * size
+
+    def tiles_for_polygon(self, polygon):
+        """Ermittelt alle Kacheln, die das Polygon schneiden."""
+        west, south, east, north = polygon.bounds
+        size = self.tile_size_deg
+        tiles = []
+        for iy in range(math.floor(south / size), math.floor(north / size) + 1):
+            for ix in range(math.floor(west / size), math.floor(east / size) + 1):
+                tile = (iy, ix)
+                if box(*self.tile_bounds(tile)).intersects(polygon):
+                    tiles.append(tile)
+        return tiles
+
+    def tile_path(self, tile, layer=None):
+        """Dateipfad einer Kachel im Speicher."""
+        iy, ix = tile
+        layer = layer or self.network_type
+        return os.path.join(self.store_dir, f"{layer}_{self.tile_size_deg:g}_{iy}_{ix}.pkl")
+
+    def _build_tile(self, tile, network_type, custom_filter):
+        """Lädt eine Kachel von Overpass (unvereinfacht, damit Kanten an den Rändern zusammenpassen)."""
+        tile_polygon = box(*self.tile_bounds(tile))
+        try:
+            return ox.graph_from_polygon(
+                tile_polygon,
+                network_type=network_type,
+                custom_filter=custom_filter,
+                simplify=False,
+                retain_all=True,
+                truncate_by_edge=True
+            )
+        except ValueError:
+            # Leere Kachel (z.B. Meer) merken, damit sie nicht erneut angefragt wird
+            return nx.MultiDiGraph(crs="EPSG:4326")
+
+    def load_tile(self, tile, layer=None, custom_filter=None):
+        """Lädt eine Kachel aus dem Speicher oder baut sie bei Bedarf."""
+        path = self.tile_path(tile, layer)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    graph = pickle.load(f)
+                # mtime als LRU-Zeitstempel aktualisieren
+                os.utime(path, None)
+                return graph
+            except (pickle.UnpicklingError, EOFError, OSError):
+                pass
+
+        graph = self._build_tile(tile, self.network_type, custom_filter)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+        return graph
+
+    def graph_from_polygon(self, polygon, layer=None, custom_filter=None, simplify=True, retain_all=False):
+        """Setzt das Straßennetz für ein Polygon aus den gespeicherten Kacheln zusammen.
+
+        Mit retain_all=False wird nur die größte zusammenhängende Komponente behalten.
+        """
+        tile_graphs = [self.load_tile(tile, layer, custom_filter) for tile in self.tiles_for_polygon(polygon)]
+        tile_graphs = [g for g in tile_graphs if len(g) > 0]
+        if not tile_graphs:
+            raise ValueError("Keine Straßen im angefragten Gebiet gefunden")
+
+        G = nx.compose_all(tile_graphs)
+        G.graph['crs'] = tile_graphs[0].graph.get('crs', "EPSG:4326")
+        G.graph['simplified'] = False
+
+        G = truncate_graph_polygon(G, polygon)
+        if len(G) == 0:
+            raise ValueError("Keine Straßen im angefragten Gebiet gefunden")
+        if simplify:
+            G = ox.simplify_graph(G)
+        if retain_all:
+            return G
+
+        # Nur die größte zusammenhängende Komponente behalten (wie osmnx)
+        largest = max(nx.weakly_connected_components(G), key=len)
+        return G.subgraph(largest).copy()
+
+    def prewarm(self, polygon, layer=None, custom_filter=None):
+        """Lädt alle Kacheln eines Gebiets vorab in den Speicher."""
+        tiles = self.tiles_for_polygon(polygon)
+        for tile in tiles:
+            self.load_tile(tile, layer, custom_filter)
+        return len(tiles)
+
+    def size_bytes(self):
+        """Gesamtgröße aller gespeicherten Kacheln."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.store_dir) if entry.name.endswith('.pkl'))
+
+    def evict(self):
+        """Entfernt die am längsten nicht genutzten Kacheln, bis das Größenlimit eingehalten ist."""
+        with self._lock:
+            entries = [entry for entry in os.scandir(self.store_dir) if entry.name.endswith('.pkl')]
+            total = sum(entry.stat().st_size for entry in entries)
+            if total <= self.max_size_bytes:
+                return 0
+
+            removed = 0
+            for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+                if total <= self.max_size_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    total -= size
+                    removed += 1
+                except OSError:
+                    continue
+            return removed
+
+
+def main():
+    """Kommandozeile zum Vorwärmen des Kachel-Speichers."""
+    from config import config
+
+    cfg = config[os.environ.get('FLASK_ENV', 'default')]
+    parser = argparse.ArgumentParser(description="Straßennetz-Kacheln für eine Region vorab laden")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--place', help="Ortsname, z.B. 'Schleswig-Holstein, Deutschland'")
+    group.add_argument('--bbox', nargs=4, type=float, metavar=('WEST', 'SUED', 'OST', 'NORD'),
+                       help="Begrenzungsrahmen in WGS84")
+    args = parser.parse_args()
+
+    if args.place:
+        polygon = ox.geocode_to_gdf(args.place).geometry.iloc[0]
+    else:
+        polygon = box(*args.bbox)
+
+    store = TileGraphStore(cfg.GRAPH_STORE_DIR, cfg.GRAPH_TILE_SIZE_DEG, cfg.GRAPH_STORE_MAX_MB)
+    start = time.time()
+    count = store.prewarm(polygon)
+    print(f"✅ {count} Kacheln geladen in {time.time() - start:.1f}s ({store.size_bytes() / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
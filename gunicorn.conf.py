@@ -0,0 +1,14 @@
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# Geo-Stack im Master laden (wsgi.py), Worker erben ihn per fork
+preload_app = True
+
+# Job-Status und Ergebnisse liegen in SQLite (JOB_STORE_DB, RESULT_STORE_DB),
+# jeder Worker kann daher jede Statusabfrage beantworten
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Synchrone Analysen großer Radien können mehrere Minuten dauern
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
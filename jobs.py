@@ -0,0 +1,172 @@
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def job_key(**params):
+    """Stabiler Schlüssel für identische Anfragen."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class JobManager:
+    """Führt lange Pipeline-Läufe in einem Worker-Pool aus und verfolgt deren Fortschritt.
+
+    Der Status liegt in SQLite, damit jeder Server-Prozess (mehrere
+    gunicorn-Worker) ihn abfragen kann; ausgeführt wird ein Job in dem
+    Prozess, der ihn angenommen hat. Identische Anfragen (gleicher Schlüssel),
+    die während eines laufenden Jobs eintreffen, erhalten dieselbe Job-ID.
+    Abgeschlossene Jobs und Jobs ohne Fortschritt (z.B. nach Absturz eines
+    Workers) werden nach ttl_s Sekunden verworfen.
+    """
+
+    def __init__(self, stages, db_path, kind="map", max_workers=2, ttl_s=3600):
+        self.stages = list(stages)
+        self.db_path = db_path
+        self.kind = kind
+        self.ttl_s = ttl_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"job-{kind}")
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL,"
+                " stages TEXT NOT NULL, current_stage TEXT, result TEXT, error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (kind, key, status)")
+
+    @contextmanager
+    def _connect(self):
+        """Verbindung im Autocommit-Modus, die am Ende immer geschlossen wird."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, key, func, *args, **kwargs):
+        """Startet func(*args, progress=..., **kwargs) als Job; gibt (Job-ID, neu angelegt) zurück."""
+        self._purge()
+        now = time.time()
+        with self._connect() as conn:
+            # Prüfen und Anlegen in einer Schreibtransaktion, damit parallele Worker nicht doppelt starten
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f"SELECT id FROM jobs WHERE kind = ? AND key = ? AND status IN {ACTIVE_STATUSES}"
+                    " AND updated_at >= ?",
+                    (self.kind, key, now - self.ttl_s)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return row[0], False
+
+                job_id = uuid.uuid4().hex
+                stages = [{"name": name, "status": "pending", "duration_s": None} for name in self.stages]
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, key, status, created_at, updated_at, stages)"
+                    " VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, self.kind, key, now, now, json.dumps(stages))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id, True
+
+    def _update(self, job_id, change):
+        """Liest den Job, wendet change(job) an und schreibt ihn zurück (nur der ausführende Prozess schreibt)."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT status, stages, current_stage FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            job = {"status": row[0], "stages": json.loads(row[1]), "current_stage": row[2],
+                   "finished_at": None, "result": None, "error": None}
+            change(job)
+            conn.execute(
+                "UPDATE jobs SET status = ?, stages = ?, current_stage = ?, updated_at = ?, finished_at = ?,"
+                " result = ?, error = ? WHERE id = ?",
+                (job["status"], json.dumps(job["stages"]), job["current_stage"], time.time(), job["finished_at"],
+                 None if job["result"] is None else json.dumps(job["result"]), job["error"], job_id)
+            )
+
+    def _set_stage(self, job_id, stage_name):
+        """Markiert die laufende Stufe als erledigt und startet die nächste."""
+        now = time.time()
+
+        def change(job):
+            for stage in job["stages"]:
+                if stage["status"] == "running":
+                    stage["status"] = "done"
+                    stage["duration_s"] = round(now - stage["started_at"], 3)
+            for stage in job["stages"]:
+                if stage["name"] == stage_name:
+                    stage["status"] = "running"
+                    stage["started_at"] = now
+            job["current_stage"] = stage_name
+
+        self._update(job_id, change)
+
+    def _finish(self, job_id, result=None, error=None):
+        """Schließt einen Job ab; neue Anfragen mit gleichem Schlüssel starten danach einen neuen Job."""
+        now = time.time()
+
+        def change(job):
+            for stage in job["stages"]:
+                if stage["status"] == "running":
+                    stage["status"] = "done" if error is None else "error"
+                    stage["duration_s"] = round(now - stage["started_at"], 3)
+            job["status"] = "done" if error is None else "error"
+            job["result"] = result
+            job["error"] = error
+            job["current_stage"] = None
+            job["finished_at"] = now
+
+        self._update(job_id, change)
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, lambda job: job.update(status="running"))
+        try:
+            result = func(*args, progress=lambda stage: self._set_stage(job_id, stage), **kwargs)
+        except Exception as e:
+            self._finish(job_id, error=str(e))
+        else:
+            self._finish(job_id, result=result)
+
+    def get(self, job_id):
+        """Gibt eine Momentaufnahme des Jobs zurück (oder None)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, current_stage, stages, result, error FROM jobs WHERE id = ? AND kind = ?",
+                (job_id, self.kind)
+            ).fetchone()
+        if row is None:
+            return None
+        stages = json.loads(row[3])
+        done = sum(1 for stage in stages if stage["status"] == "done")
+        return {
+            "id": row[0],
+            "status": row[1],
+            "current_stage": row[2],
+            "progress": round(done / len(stages), 2) if stages else None,
+            "stages": [{"name": s["name"], "status": s["status"], "duration_s": s["duration_s"]} for s in stages],
+            "result": None if row[4] is None else json.loads(row[4]),
+            "error": row[5]
+        }
+
+    def _purge(self):
+        """Entfernt abgelaufene Jobs."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE kind = ? AND COALESCE(finished_at, updated_at) < ?",
+                         (self.kind, time.time() - self.ttl_s))
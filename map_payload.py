@@ -0,0 +1,166 @@
+import json
+
+import numpy as np
+import shapely
+
+# Farben je Himmelsrichtung (Folium-Markerfarben)
+DIRECTION_COLORS = {
+    "N": "darkblue", 
+    "NE": "blue", 
+    "E": "cadetblue", 
+    "SE": "green", 
+    "S": "darkgreen", 
+    "SW": "orange", 
+    "W": "red", 
+    "NW": "darkred"
+}
+
+
+def quantize(coords, precision=5):
+    """Rundet Koordinaten auf die gegebene Anzahl Nachkommastellen (5 ≈ 1 m)."""
+    return np.round(np.asarray(coords, dtype=float), precision).tolist()
+
+
+def _clean(value, default=None):
+    """Ersetzt fehlende Werte (None/NaN) durch einen Standardwert."""
+    if value is None or (isinstance(value, float) and value != value):
+        return default
+    return value
+
+
+def _feature(geometry_type, coordinates, **properties):
+    return {
+        "type": "Feature",
+        "geometry": {"type": geometry_type, "coordinates": coordinates},
+        "properties": properties
+    }
+
+
+def build_geojson_payload(festival_lat, festival_lon, radius_m, connections_gdf, results_list, precision=5,
+                          isochrone=None):
+    """Baut eine kompakte GeoJSON-FeatureCollection für die Darstellung im Browser.
+
+    Koordinaten werden quantisiert (die Routen sind bereits in der
+    Geometrie-Pipeline vereinfacht) und alle grauen Anschlussstellen in einem
+    einzigen MultiPoint-Feature zusammengefasst.
+    """
+    features = [
+        _feature("Point", quantize([festival_lon, festival_lat], precision),
+                 kind="festival", radius_m=radius_m)
+    ]
+
+    if isochrone is not None:
+        # Per Straße erreichbares Gebiet (Netzwerk-Modus der Ausfahrtswahl)
+        geometry = json.loads(shapely.to_geojson(shapely.set_precision(isochrone, 10 ** -precision)))
+        features.append({"type": "Feature", "geometry": geometry, "properties": {"kind": "isochrone"}})
+
+    if len(connections_gdf) > 0:
+        junction_coords = np.column_stack([connections_gdf.geometry.x.values, connections_gdf.geometry.y.values])
+        features.append(_feature("MultiPoint", quantize(junction_coords, precision), kind="junctions"))
+
+    for r in results_list:
+        direction = r["direction"]
+        color = r["color"]
+        markets_df = r["markets_df"]
+
+        features.append(_feature("Point", quantize([r["exit_point"].x, r["exit_point"].y], precision),
+                                 kind="exit", direction=direction, color=color, markets_count=len(markets_df)))
+
+        features.append(_feature("LineString", quantize(shapely.get_coordinates(r["route_line_wgs"]), precision),
+                                 kind="route", direction=direction, color=color, markets_count=len(markets_df)))
+
+        for _, store_row in markets_df.iterrows():
+            rating = _clean(store_row.get('rating'))
+            features.append(_feature(
+                "Point", quantize([store_row.geometry.x, store_row.geometry.y], precision),
+                kind="market",
+                direction=direction,
+                color=color,
+                name=_clean(store_row.get('name'), 'Markt'),
+                vicinity=_clean(store_row.get('vicinity'), ''),
+                rating=None if rating is None else float(rating)
+            ))
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_folium_map(lat, lon, radius_km, connections_gdf, results_list, isochrone=None):
+    """Rendert die Analyse als Folium-Karte und gibt sie als HTML-String zurück."""
+    import folium
+    
+    radius_m = radius_km * 1000
+    
+    # Karte erstellen
+    m = folium.Map(location=[lat, lon], zoom_start=9)
+
+    # Festival-Marker
+    folium.Marker(
+        location=[lat, lon], 
+        popup="Festivalort", 
+        icon=folium.Icon(color='purple', icon='star')
+    ).add_to(m)
+
+    # Suchradius
+    folium.Circle(
+        location=[lat, lon], 
+        radius=radius_m, 
+        color='black', 
+        fill=False, 
+        dash_array='5,5', 
+        tooltip=f"{radius_km} km Umkreis"
+    ).add_to(m)
+
+    # Per Straße erreichbares Gebiet
+    if isochrone is not None:
+        folium.GeoJson(
+            json.loads(shapely.to_geojson(isochrone)),
+            style_function=lambda _: {"color": "purple", "weight": 1, "fillOpacity": 0.08},
+            tooltip="Per Straße erreichbar"
+        ).add_to(m)
+
+    # Alle Anschlussstellen (grau)
+    for _, rowc in connections_gdf.iterrows():
+        folium.CircleMarker(
+            location=[rowc.geometry.y, rowc.geometry.x], 
+            radius=2, 
+            color='gray', 
+            fill=True, 
+            fill_opacity=0.6,
+            popup=f"Anschlussstelle: {rowc.get('conn_type', 'unknown')}"
+        ).add_to(m)
+
+    # Routen und gefilterte Märkte anzeigen
+    for r in results_list:
+        direction = r["direction"]
+        exit_pt = r["exit_point"]
+        route_line = r["route_line_wgs"]
+        markets_df = r["markets_df"]
+        color = r["color"]
+
+        # Anschlussstelle markieren
+        folium.Marker(
+            location=[exit_pt.y, exit_pt.x], 
+            popup=f"{direction}-Anschlussstelle<br>Märkte: {len(markets_df)}", 
+            icon=folium.Icon(color=color, icon='flag')
+        ).add_to(m)
+
+        # Route zeichnen
+        coords_list = [(y, x) for x, y in route_line.coords]
+        folium.PolyLine(
+            locations=coords_list, 
+            color=color, 
+            weight=4, 
+            opacity=0.7, 
+            tooltip=f"Route Richtung {direction} ({len(markets_df)} Märkte)"
+        ).add_to(m)
+
+        # Nur Märkte entlang der Route anzeigen
+        for _, store_row in markets_df.iterrows():
+            folium.Marker(
+                location=[store_row.geometry.y, store_row.geometry.x],
+                icon=folium.Icon(color=color, icon='shopping-cart'),
+                popup=f"<b>{store_row.get('name', 'Markt')}</b><br>Richtung: {direction}<br>Adresse: {store_row.get('vicinity', '')}<br>Bewertung: {store_row.get('rating', 'N/A')}"
+            ).add_to(m)
+    
+    # Karte als HTML-String zurückgeben
+    return m._repr_html_()
@@ -0,0 +1,220 @@
+import io
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("routenanalyse.trace")
+
+# Obergrenzen der Histogramm-Buckets in Sekunden bzw. für Größen (Knoten, Kanten, Märkte)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+_local = threading.local()
+
+
+class Histogram:
+    """Kumulatives Histogramm im Prometheus-Format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Trace:
+    """Zeiten und Zähler eines einzelnen Analyse-Laufs."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+        self.status = "ok"
+        self.error = None
+        self.duration_s = None
+
+    @contextmanager
+    def stage(self, name):
+        """Misst die Dauer einer Stufe (mehrfache Aufrufe werden addiert)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_value(self, name, value):
+        self.values[name] = value
+
+    def to_dict(self):
+        return {
+            "trace": self.name,
+            "labels": self.labels,
+            "status": self.status,
+            "error": self.error,
+            "duration_s": round(self.duration_s or 0.0, 4),
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "counters": self.counters,
+            "values": self.values
+        }
+
+
+class Metrics:
+    """Prozessweite Sammlung der Stufenzeiten und Zähler aller Analyse-Läufe.
+
+    Läufe werden über trace() gestartet; Stufen und Zähler innerhalb des
+    Laufs landen über den thread-lokalen aktuellen Trace darin, ohne dass er
+    durch die Pipeline gereicht werden muss.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stage_histograms = {}
+        self._run_histogram = Histogram()
+        self._runs = {}
+        self._counters = {}
+        self._value_histograms = {}
+
+    @contextmanager
+    def trace(self, name, **labels):
+        """Startet einen Trace für den aktuellen Thread, protokolliert und aggregiert ihn am Ende."""
+        trace = Trace(name, **labels)
+        previous = getattr(_local, "trace", None)
+        _local.trace = trace
+        try:
+            yield trace
+        except Exception as e:
+            trace.status = "error"
+            trace.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _local.trace = previous
+            trace.duration_s = time.perf_counter() - trace.started
+            self._observe(trace)
+            logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+
+    def _observe(self, trace):
+        with self._lock:
+            self._run_histogram.observe(trace.duration_s)
+            self._runs[trace.status] = self._runs.get(trace.status, 0) + 1
+            for stage, seconds in trace.stages.items():
+                self._stage_histograms.setdefault(stage, Histogram()).observe(seconds)
+            for name, value in trace.counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, value in trace.values.items():
+                self._value_histograms.setdefault(name, Histogram(SIZE_BUCKETS)).observe(value)
+
+    def render_prometheus(self, prefix="routenanalyse"):
+        """Gibt alle Kennzahlen im Prometheus-Textformat zurück."""
+        lines = []
+
+        def histogram(name, hist, labels=""):
+            sep = "," if labels else ""
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.total}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {hist.sum:.6f}")
+            lines.append(f"{name}_count{suffix} {hist.total}")
+
+        with self._lock:
+            lines.append(f"# HELP {prefix}_run_seconds Dauer eines Analyse-Laufs")
+            lines.append(f"# TYPE {prefix}_run_seconds histogram")
+            histogram(f"{prefix}_run_seconds", self._run_histogram)
+
+            lines.append(f"# HELP {prefix}_runs_total Analyse-Läufe nach Ergebnis")
+            lines.append(f"# TYPE {prefix}_runs_total counter")
+            for status, count in sorted(self._runs.items()):
+                lines.append(f'{prefix}_runs_total{{status="{status}"}} {count}')
+
+            lines.append(f"# HELP {prefix}_stage_seconds Dauer je Pipeline-Stufe")
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, hist in sorted(self._stage_histograms.items()):
+                histogram(f"{prefix}_stage_seconds", hist, f'stage="{stage}"')
+
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+
+            for name, hist in sorted(self._value_histograms.items()):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                histogram(f"{prefix}_{name}", hist)
+
+        return "\n".join(lines) + "\n"
+
+
+def current_trace():
+    """Gibt den Trace des laufenden Analyse-Laufs im aktuellen Thread zurück (oder None)."""
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def timed(stage):
+    """Misst eine Stufe im aktuellen Trace; ohne Trace wirkungslos."""
+    trace = current_trace()
+    if trace is None:
+        yield
+    else:
+        with trace.stage(stage):
+            yield
+
+
+def count(name, value=1):
+    """Erhöht einen Zähler im aktuellen Trace; ohne Trace wirkungslos."""
+    trace = current_trace()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def set_value(name, value):
+    """Hält eine Größe (z.B. Knotenzahl) im aktuellen Trace fest; ohne Trace wirkungslos."""
+    trace = current_trace()
+    if trace is not None:
+        trace.set_value(name, value)
+
+
+@contextmanager
+def profiled(mode):
+    """Profiliert den Block mit cProfile oder pyinstrument; das Ergebnis steht danach in report["text"]."""
+    report = {"mode": mode, "text": None}
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            report["text"] = "pyinstrument ist nicht installiert"
+            yield report
+            return
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield report
+        finally:
+            profiler.stop()
+            report["text"] = profiler.output_text(unicode=True)
+    else:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield report
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+            report["text"] = stream.getvalue()
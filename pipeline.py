@@ -0,0 +1,485 @@
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import osmnx as ox
+import shapely
+from shapely.geometry import Point
+
+import metrics
+from staged_loader import load_staged_graph
+from routing import csr_shortest_path_tree, csr_path_from_tree
+from csr_graph import CSRGraph
+from exit_selection import junction_candidates, assign_sectors, sector_labels, nearest_per_sector
+from corridors import corridor_membership
+from places_cache import cells_for_circle, markets_in_radius
+from map_payload import DIRECTION_COLORS, build_geojson_payload, build_folium_map
+from geometry import LocalProjection
+
+
+class PipelineError(Exception):
+    """Fachlicher Fehler der Analyse (Meldung wird dem Nutzer angezeigt)."""
+
+
+def estimate_bytes(value):
+    """Grobe Schätzung des Speicherbedarfs eines Stufenergebnisses (eingeblendete Arrays zählen nicht)."""
+    if isinstance(value, CSRGraph):
+        return value.memory_bytes()
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(estimate_bytes(item) for item in value.flat)
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, shapely.Geometry):
+        return 100 + 16 * int(shapely.get_num_coordinates(value))
+    if isinstance(value, dict):
+        return 64 * len(value) + sum(estimate_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return 8 * len(value) + sum(estimate_bytes(item) for item in value)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 64
+
+
+class StageCache:
+    """Kleiner LRU-Cache für Zwischenergebnisse der Pipeline-Stufen mit Ablaufzeit.
+
+    Begrenzt durch die Anzahl der Einträge und optional durch ein
+    Speicherbudget (max_size_mb), das mit anderen Caches geteilt werden kann
+    (shared_bytes). Gecachte Werte werden von mehreren Anfragen geteilt und
+    dürfen nicht verändert werden.
+    """
+
+    def __init__(self, max_entries=64, ttl_s=3600, max_size_mb=None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_size_bytes = None if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        # Belegung anderer Caches, die sich das Budget teilen
+        self.shared_bytes = lambda: 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl_s:
+                del self._entries[key]
+                self._size_bytes -= entry[2]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        size = estimate_bytes(value)
+        if self.max_size_bytes is not None and size > self.max_size_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size_bytes -= old[2]
+            self._entries[key] = (time.time(), value, size)
+            self._size_bytes += size
+            # Älteste Einträge verdrängen; der neue Eintrag bleibt in jedem Fall erhalten
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._over_budget()):
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= evicted[2]
+
+    def _over_budget(self):
+        return (self.max_size_bytes is not None
+                and self._size_bytes + self.shared_bytes() > self.max_size_bytes)
+
+    def size_bytes(self):
+        """Geschätzte Belegung in Bytes (ohne Sperre, für das geteilte Budget)."""
+        return self._size_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def memo(self, key, compute, store=True):
+        """Gibt den gecachten Wert zurück oder berechnet und speichert ihn.
+
+        Mit store=False wird ein neu berechneter Wert nicht gespeichert (z.B.
+        wenn er auf unvollständigen Eingaben beruht).
+        """
+        value = self.get(key)
+        if value is None:
+            metrics.count(f"stage_cache_misses_{key[0]}")
+            value = compute()
+            if store:
+                self.put(key, value)
+        else:
+            metrics.count(f"stage_cache_hits_{key[0]}")
+        return value
+
+
+class AnalysisPipeline:
+    """Analyse-Pipeline in gecachten Stufen: Graph, Anschlussstellen, Routen,
+    Märkte je Suchbegriff, Korridor-Zugehörigkeit und Darstellung.
+
+    Jede Stufe ist über ihre Eingaben verschlüsselt. Ändert sich nur der
+    Routenpuffer oder die Begriffsauswahl, werden lediglich die nachgelagerten
+    Stufen neu berechnet.
+    """
+
+    def __init__(self, config, graph_store, detail_graph_store, graph_cache, places_cache, places_client,
+                 usage_store, csr_store=None, max_entries=64, ttl_s=3600):
+        self.config = config
+        self.graph_store = graph_store
+        self.detail_graph_store = detail_graph_store
+        self.graph_cache = graph_cache
+        self.places_cache = places_cache
+        self.places_client = places_client
+        self.usage_store = usage_store
+        self.csr_store = csr_store
+        # Zwischenergebnisse und Graph-Cache teilen sich dasselbe Speicherbudget (GRAPH_CACHE_MAX_MB)
+        self.cache = StageCache(max_entries=max_entries, ttl_s=ttl_s,
+                                max_size_mb=graph_cache.max_size_bytes / (1024 * 1024))
+        self.cache.shared_bytes = graph_cache.size_bytes
+        graph_cache.shared_bytes = self.cache.size_bytes
+
+    def graph(self, lat, lon, radius_km):
+        """Straßennetz für den Suchkreis (über den prozessweiten Graph-Cache)."""
+        radius_m = radius_km * 1000
+        circle_polygon = LocalProjection(lat, lon).circle(radius_m)
+
+        # Zuerst In-Memory-Cache, dann Kachel-Speicher
+        loading_mode = self._loading_mode(radius_km)
+        G = self.graph_cache.get(lat, lon, radius_km, circle_polygon, mode=loading_mode)
+        if G is None:
+            metrics.count("graph_loads")
+            try:
+                if loading_mode == "staged":
+                    # Hauptstraßen für den ganzen Radius, Detailnetz nur nahe Festival und Korridoren
+                    G = load_staged_graph(
+                        self.graph_store, self.detail_graph_store, lat, lon, circle_polygon,
+                        local_radius_km=self.config.get('GRAPH_LOCAL_RADIUS_KM'),
+                        corridor_width_m=self.config.get('GRAPH_CORRIDOR_WIDTH_M'),
+                        highway_values=self.config.get('HIGHWAY_VALUES'),
+                        fallback_types=self.config.get('FALLBACK_HIGHWAY_TYPES'),
+                        n_sectors=self.config.get('EXIT_SECTORS', 8)
+                    )
+                else:
+                    G = self.graph_store.graph_from_polygon(circle_polygon)
+            except Exception:
+                G = ox.graph_from_point((lat, lon), dist=radius_m, network_type='drive')
+            self.graph_cache.put(lat, lon, radius_km, G, mode=loading_mode)
+        return G
+
+    def _loading_mode(self, radius_km):
+        if radius_km <= self.config.get('GRAPH_LOCAL_RADIUS_KM'):
+            return "full"
+        return self.config.get('GRAPH_LOADING_MODE')
+
+    def routing_graph(self, lat, lon, radius_km):
+        """Kompaktes CSR-Routing-Netz samt Anschlussstellen-Kandidaten (Speicher, dann Festplatte, dann Aufbau)."""
+        precision = self.config.get('GRAPH_CACHE_PRECISION')
+        store_key = (round(lat, precision), round(lon, precision), radius_km, self._loading_mode(radius_km))
+
+        def compute():
+            csr = self.csr_store.get(store_key) if self.csr_store is not None else None
+            if csr is None:
+                G = self.graph(lat, lon, radius_km)
+                # Anschlussstellen einmalig beim Aufbau lesen und mit den Arrays ablegen
+                junctions = junction_candidates(
+                    G, self.config.get('HIGHWAY_VALUES'), self.config.get('FALLBACK_HIGHWAY_TYPES'))
+                csr = CSRGraph.from_networkx(G, junctions=junctions)
+                if self.csr_store is not None:
+                    self.csr_store.put(store_key, csr)
+                    # Eingeblendet aus dem Speicher weiterverwenden statt die frisch gebauten Arrays zu halten
+                    stored = self.csr_store.get(store_key)
+                    if stored is not None:
+                        csr = stored
+            return csr
+
+        csr = self.cache.memo(("csr", lat, lon, radius_km), compute)
+        metrics.set_value("graph_nodes", csr.n_nodes)
+        metrics.set_value("graph_edges", csr.n_edges)
+        return csr
+
+    def exits(self, lat, lon, radius_km):
+        """Alle Anschlussstellen und die nächste je Richtungssektor."""
+        def compute():
+            csr = self.routing_graph(lat, lon, radius_km)
+            conn_lons, conn_lats, conn_types = csr.junction_lons, csr.junction_lats, csr.junction_types
+            if len(conn_lons) == 0:
+                raise PipelineError("Keine Anschlussstellen gefunden")
+
+            connections_gdf = gpd.GeoDataFrame(
+                {"conn_type": conn_types},
+                geometry=gpd.points_from_xy(conn_lons, conn_lats),
+                crs="EPSG:4326"
+            )
+
+            # Distanz, Peilung und Sektor zum Festival (vektorisiert)
+            n_sectors = self.config.get('EXIT_SECTORS', 8)
+            dist_km, bearing_values, sectors = assign_sectors(lat, lon, conn_lats, conn_lons, n_sectors)
+            connections_gdf["festival_dist_km"] = dist_km
+            connections_gdf["bearing"] = bearing_values
+            connections_gdf["direction"] = np.asarray(sector_labels(n_sectors), dtype=object)[sectors]
+
+            # Anschlussstellen einmal am Knotenindex einrasten (für Routing und Straßendistanz)
+            exit_nodes = csr.nearest_nodes(conn_lons, conn_lats)
+            connections_gdf["node"] = exit_nodes
+
+            # Pro Sektor: nächste Anschlussstelle auswählen (Luftlinie oder Straßendistanz)
+            if self.config.get('EXIT_SELECTION_MODE') == "network":
+                # Außerhalb der Suchgrenze liegende Anschlussstellen scheiden aus
+                network_dist_m = self.reachability(lat, lon, radius_km)["distances"][exit_nodes]
+                connections_gdf["network_dist_km"] = network_dist_m / 1000
+                reachable = np.flatnonzero(np.isfinite(network_dist_m))
+                selected_idx = reachable[nearest_per_sector(sectors[reachable], network_dist_m[reachable])]
+            else:
+                selected_idx = nearest_per_sector(sectors, dist_km)
+            if len(selected_idx) == 0:
+                raise PipelineError("Keine Anschlussstellen in den Hauptrichtungen gefunden")
+
+            return connections_gdf, connections_gdf.iloc[selected_idx]
+
+        return self.cache.memo(("exits", lat, lon, radius_km), compute)
+
+    def reachability(self, lat, lon, radius_km):
+        """Kürzeste-Wege-Baum ab dem Festival (im Netzwerk-Modus begrenzt) samt Isochrone."""
+        def compute():
+            csr = self.routing_graph(lat, lon, radius_km)
+            network_mode = self.config.get('EXIT_SELECTION_MODE') == "network"
+
+            festival_node = int(csr.nearest_nodes(lon, lat)[0])
+            if network_mode:
+                distances, predecessors, cutoff_m = self._sector_bounded_tree(csr, lat, lon, radius_km, festival_node)
+            else:
+                cutoff_m = np.inf
+                distances, predecessors = csr_shortest_path_tree(csr, festival_node)
+            reached = np.isfinite(distances)
+            metrics.set_value("reached_nodes", int(reached.sum()))
+            metrics.set_value("reached_share", round(float(reached.mean()), 3))
+
+            # Erreichte Knoten als Fläche (nur im Netzwerk-Modus, sonst wäre es das ganze Netz);
+            # None, wenn sie nach dem Ausdünnen keine Fläche aufspannen
+            isochrone = None
+            if network_mode and reached.sum() >= 3:
+                lons, lats = csr.coords(np.flatnonzero(reached))
+                isochrone = LocalProjection(lat, lon).hull(lons, lats, ratio=self.config.get('ISOCHRONE_HULL_RATIO'),
+                                                           grid_m=self.config.get('ISOCHRONE_GRID_M'))
+            return {
+                "festival_node": festival_node,
+                "distances": distances.astype(np.float32),
+                "predecessors": predecessors,
+                "cutoff_m": cutoff_m,
+                "isochrone": isochrone
+            }
+
+        return self.cache.memo(("reach", lat, lon, radius_km), compute)
+
+    def _sector_bounded_tree(self, csr, lat, lon, radius_km, festival_node):
+        """Kürzeste-Wege-Baum, der nur so weit sucht, bis jeder Sektor eine erreichte Anschlussstelle hat.
+
+        Die erste Suchgrenze ist die größte Luftlinie der je Sektor nächsten
+        Anschlussstelle mal EXIT_NETWORK_DETOUR_FACTOR; fehlt danach noch ein
+        Sektor, wird die Grenze bis höchstens Suchradius mal
+        EXIT_NETWORK_CUTOFF_FACTOR verdoppelt. Die Auswahl bleibt exakt: eine
+        Anschlussstelle mit kürzerer Straßendistanz als die erreichte läge
+        ebenfalls innerhalb der Grenze. Gibt (Distanzen, Vorgänger, Grenze) zurück.
+        """
+        max_cutoff_m = radius_km * 1000 * self.config.get('EXIT_NETWORK_CUTOFF_FACTOR')
+        conn_lons, conn_lats = csr.junction_lons, csr.junction_lats
+        if len(conn_lons) == 0:
+            return (*csr_shortest_path_tree(csr, festival_node, limit=max_cutoff_m), max_cutoff_m)
+
+        dist_km, _, sectors = assign_sectors(lat, lon, conn_lats, conn_lons, self.config.get('EXIT_SECTORS', 8))
+        exit_nodes = csr.nearest_nodes(conn_lons, conn_lats)
+        farthest_km = dist_km[nearest_per_sector(sectors, dist_km)].max()
+        cutoff_m = min(farthest_km * 1000 * self.config.get('EXIT_NETWORK_DETOUR_FACTOR'), max_cutoff_m)
+
+        all_sectors = set(sectors.tolist())
+        while True:
+            distances, predecessors = csr_shortest_path_tree(csr, festival_node, limit=cutoff_m)
+            reached_sectors = set(sectors[np.isfinite(distances[exit_nodes])].tolist())
+            if reached_sectors == all_sectors or cutoff_m >= max_cutoff_m:
+                metrics.set_value("network_cutoff_m", round(cutoff_m))
+                return distances, predecessors, cutoff_m
+            cutoff_m = min(cutoff_m * 2, max_cutoff_m)
+
+    def routes(self, lat, lon, radius_km):
+        """Routen vom Festival zu den ausgewählten Anschlussstellen (metrisch und WGS84)."""
+        def compute():
+            csr = self.routing_graph(lat, lon, radius_km)
+            _, selected_exits_gdf = self.exits(lat, lon, radius_km)
+            projection = LocalProjection(lat, lon)
+
+            # Alle Routen aus einem einzigen Kürzeste-Wege-Baum ab dem Festival lesen
+            reach = self.reachability(lat, lon, radius_km)
+
+            route_infos = []
+            route_coord_arrays = []
+            for _, row in selected_exits_gdf.iterrows():
+                route_nodes = csr_path_from_tree(reach["predecessors"], reach["festival_node"], int(row["node"]))
+                if route_nodes is None or len(route_nodes) < 2:
+                    continue
+
+                route_coord_arrays.append(csr.coords(route_nodes))
+                route_infos.append({"direction": row["direction"], "exit_point": row.geometry})
+
+            # Routen metrisch projizieren und vereinfachen; Korridore bleiben im metrischen System
+            routes_metric = projection.route_lines(route_coord_arrays, self.config.get('ROUTE_SIMPLIFY_TOLERANCE_M'))
+            for route_info, route_line_wgs in zip(route_infos, projection.to_wgs(routes_metric)):
+                route_info["route_line_wgs"] = route_line_wgs
+
+            # Farbzuordnung für Richtungen (Zusatzfarben für Sektoreinteilungen abseits der acht Himmelsrichtungen)
+            fallback_colors = list(DIRECTION_COLORS.values())
+            for i, route_info in enumerate(route_infos):
+                route_info["color"] = DIRECTION_COLORS.get(route_info["direction"],
+                                                           fallback_colors[i % len(fallback_colors)])
+            return route_infos, routes_metric
+
+        return self.cache.memo(("routes", lat, lon, radius_km), compute)
+
+    def markets(self, lat, lon, radius_km, terms):
+        """Märkte im Suchkreis; jeder Suchbegriff wird einzeln gecacht.
+
+        Gibt (GeoDataFrame, vollständig) zurück. vollständig ist False, wenn
+        für einen Begriff nicht alle Rasterzellen geladen werden konnten.
+        """
+        radius_m = radius_km * 1000
+        by_term = {term: self.cache.get(("markets", lat, lon, radius_km, term)) for term in terms}
+        missing_terms = [term for term, markets in by_term.items() if markets is None]
+        complete = True
+
+        if missing_terms:
+            if not self.config.get('MAPS_API_KEY'):
+                raise PipelineError("Kein API-Key verfügbar")
+
+            # Suchgebiet in Rasterzellen aufteilen und gecachte Zellen wiederverwenden
+            cells = cells_for_circle(lat, lon, radius_m, self.config.get('PLACES_GRID_LEVELS_DEG'))
+            results_by_pair, missing = self.places_cache.lookup(missing_terms, cells)
+
+            # Kontingent für den ungünstigsten Fall reservieren (alle Seiten je Zelle), verbucht wird der tatsächliche Verbrauch
+            if missing:
+                reservation = self.usage_store.reserve("places", len(missing) * self.places_client.max_calls_per_query)
+                if reservation is None:
+                    raise PipelineError("API-Limit erreicht")
+
+                # Fehlende Zellen parallel abfragen (inkl. Ergebnisseiten)
+                api_calls = 0
+                try:
+                    with metrics.timed("places_fetch"):
+                        fetched_results, api_calls = self.places_cache.fetch(self.places_client, missing)
+                finally:
+                    self.usage_store.commit(reservation, api_calls)
+                    metrics.count("places_api_calls", api_calls)
+                results_by_pair.update(fetched_results)
+
+            for term in missing_terms:
+                by_term[term] = markets_in_radius(results_by_pair, [term], lat, lon, radius_m)
+                # Nur vollständig geladene Begriffe cachen (fehlgeschlagene Zellen erneut versuchen)
+                if all((term, cell) in results_by_pair for cell in cells):
+                    self.cache.put(("markets", lat, lon, radius_km, term), by_term[term])
+                else:
+                    complete = False
+
+        all_markets = [market for term in terms for market in by_term[term]]
+        market_points = [Point(m["geometry"]["location"]["lng"], m["geometry"]["location"]["lat"]) for m in all_markets]
+        return gpd.GeoDataFrame(all_markets, geometry=market_points, crs="EPSG:4326"), complete
+
+    def membership(self, lat, lon, radius_km, route_radius_km, terms, markets=None):
+        """Märkte je Route innerhalb des Korridors (Puffer route_radius_km).
+
+        markets ist das Ergebnis von markets() und wird sonst geladen. Gibt
+        (Ergebnisliste, vollständig) zurück; Ergebnisse aus unvollständigen
+        Märkten werden nicht gecacht.
+        """
+        gdf, complete = markets if markets is not None else self.markets(lat, lon, radius_km, terms)
+
+        def compute():
+            route_infos, routes_metric = self.routes(lat, lon, radius_km)
+            projection = LocalProjection(lat, lon)
+
+            markets_metric = shapely.points(*projection.to_metric_xy(gdf.geometry.x.values, gdf.geometry.y.values))
+
+            # Korridor-Zugehörigkeit aller Märkte zu allen Routen in einer Abfrage
+            corridor_result = corridor_membership(routes_metric, markets_metric, route_radius_km * 1000)
+
+            results_list = []
+            for j, route_info in enumerate(route_infos):
+                inside_mask = corridor_result["membership"][:, j]
+                inside_corridor = gdf[inside_mask].copy()
+                inside_corridor["route_distance_m"] = corridor_result["distances_m"][inside_mask, j]
+                results_list.append({
+                    **route_info,
+                    "markets_count": len(inside_corridor),
+                    "markets_df": inside_corridor
+                })
+            return results_list
+
+        key = ("membership", lat, lon, radius_km, route_radius_km, tuple(terms))
+        return self.cache.memo(key, compute, store=complete), complete
+
+    def run(self, lat, lon, radius_km, route_radius_km, terms, output="html", progress=None):
+        """Führt alle Stufen aus und gibt {"map" bzw. "geojson": ..., "markets": Exportdaten} zurück.
+
+        Der optionale progress-Callback wird beim Start jeder Stufe mit deren
+        Namen aufgerufen, auch wenn die Stufe aus dem Cache kommt.
+        """
+        def stage(name):
+            if progress is not None:
+                progress(name)
+            return metrics.timed(name)
+
+        terms = tuple(terms)
+        with stage("graph"):
+            self.routing_graph(lat, lon, radius_km)
+        with stage("junctions"):
+            self.exits(lat, lon, radius_km)
+        with stage("places"):
+            markets = self.markets(lat, lon, radius_km, terms)
+            metrics.set_value("markets_in_radius", len(markets[0]))
+        with stage("routing"):
+            self.routes(lat, lon, radius_km)
+            results_list, complete = self.membership(lat, lon, radius_km, route_radius_km, terms, markets)
+        with stage("render"):
+            key = ("render", lat, lon, radius_km, route_radius_km, terms, output)
+            result = self.cache.memo(key, lambda: self._render(lat, lon, radius_km, results_list, output),
+                                     store=complete)
+        metrics.set_value("markets_on_routes", len(result["markets"]))
+        return result
+
+    def _render(self, lat, lon, radius_km, results_list, output):
+        connections_gdf, _ = self.exits(lat, lon, radius_km)
+        isochrone = None
+        if self.config.get('EXIT_SELECTION_MODE') == "network":
+            isochrone = self.reachability(lat, lon, radius_km)["isochrone"]
+
+        # Markt-Daten für den Ergebnis-Speicher (Export, Nachfilterung) sammeln
+        found_markets = []
+        for r in results_list:
+            for _, store_row in r["markets_df"].iterrows():
+                rating = store_row.get('rating')
+                found_markets.append({
+                    'name': store_row.get('name', 'Unbekannt'),
+                    'vicinity': store_row.get('vicinity', 'Keine Adresse verfügbar'),
+                    'search_keyword': store_row.get('search_keyword', 'Unbekannt'),
+                    'lat': store_row.geometry.y,
+                    'lng': store_row.geometry.x,
+                    'direction': r["direction"],
+                    'distance_m': round(float(store_row['route_distance_m']), 1),
+                    'rating': None if rating is None or pd.isna(rating) else float(rating)
+                })
+
+        # Kompakte Vektordaten für die Darstellung im Browser
+        if output == "geojson":
+            payload = build_geojson_payload(lat, lon, radius_km * 1000, connections_gdf, results_list,
+                                            isochrone=isochrone)
+            return {"geojson": payload, "markets": found_markets}
+
+        map_html = build_folium_map(lat, lon, radius_km, connections_gdf, results_list, isochrone=isochrone)
+        return {"map": map_html, "markets": found_markets}
@@ -0,0 +1,171 @@
+import json
+import math
+import time
+import sqlite3
+
+from geodesy import haversine_km
+
+# Zellhöhen der Rasterstufen in Grad; die Breite ist jeweils das 1,5-Fache (in Mitteleuropa etwa
+# quadratisch). Die größte Stufe (≈ 67 x 60 km) bleibt mit ihrer Halbdiagonale unter dem Places-Maximum.
+GRID_LEVELS_DEG = (0.075, 0.15, 0.3, 0.6)
+GRID_ASPECT = 1.5
+PLACES_MAX_RADIUS_M = 50000
+KM_PER_DEG = 111.32
+
+
+def grid_cell_height(lat, radius_m, levels=GRID_LEVELS_DEG):
+    """Zellhöhe (Grad) der kleinsten Rasterstufe, deren Zellen den Suchkreis-Durchmesser erreichen.
+
+    Damit schneidet der Suchkreis höchstens 4 Zellen (im Mittel etwa 2,5) und
+    ein Kaltlauf kostet je Suchbegriff nur wenige Abfragen. Ab etwa 30 km
+    Radius reicht die größte Stufe nicht mehr (die Places-Abfrage einer Zelle
+    ist auf 50 km Radius begrenzt); bei 40 km sind es dann etwa 5, bei 100 km
+    etwa 15 Zellen je Suchbegriff.
+    """
+    for height in levels:
+        height_km = height * KM_PER_DEG
+        width_km = height * GRID_ASPECT * KM_PER_DEG * math.cos(math.radians(lat))
+        if min(height_km, width_km) * 1000 >= 2 * radius_m:
+            return height
+    return levels[-1]
+
+
+def cell_bounds(cell):
+    """Gibt (west, süd, ost, nord) einer Rasterzelle "Höhe:Zeile:Spalte" zurück."""
+    height, iy, ix = cell.split(":")
+    height = float(height)
+    width = height * GRID_ASPECT
+    south, west = int(iy) * height - 90, int(ix) * width - 180
+    return west, south, west + width, south + height
+
+
+def cells_for_circle(lat, lon, radius_m, levels=GRID_LEVELS_DEG):
+    """Alle Rasterzellen der zum Radius passenden Stufe, die einen Kreis um (lat, lon) schneiden."""
+    height = grid_cell_height(lat, radius_m, levels)
+    width = height * GRID_ASPECT
+    radius_km = radius_m / 1000.0
+    dlat = radius_km / KM_PER_DEG
+    dlon = radius_km / (KM_PER_DEG * max(math.cos(math.radians(lat)), 1e-6))
+
+    cells = []
+    for iy in range(math.floor((lat - dlat + 90) / height), math.floor((lat + dlat + 90) / height) + 1):
+        for ix in range(math.floor((lon - dlon + 180) / width), math.floor((lon + dlon + 180) / width) + 1):
+            south, west = iy * height - 90, ix * width - 180
+            # Nächster Punkt der Zelle zum Kreismittelpunkt
+            near_lat = min(max(lat, south), south + height)
+            near_lon = min(max(lon, west), west + width)
+            if haversine_km(lat, lon, near_lat, near_lon) <= radius_km:
+                cells.append(f"{height:g}:{iy}:{ix}")
+    return cells
+
+
+def cell_query(cell):
+    """Mittelpunkt und Suchradius (m, max. 50 km) für die Places-Abfrage einer Zelle."""
+    west, south, east, north = cell_bounds(cell)
+    lat, lon = (south + north) / 2, (west + east) / 2
+    radius_m = float(haversine_km(lat, lon, north, east)) * 1000
+    return lat, lon, min(math.ceil(radius_m), PLACES_MAX_RADIUS_M)
+
+
+def _in_cell(place, bounds):
+    west, south, east, north = bounds
+    location = place["geometry"]["location"]
+    return west <= location["lng"] < east and south <= location["lat"] < north
+
+
+class PlacesCache:
+    """Persistenter Cache für Places-Ergebnisse je Suchbegriff und Rasterzelle (SQLite)."""
+
+    def __init__(self, db_path, ttl_hours=168):
+        self.db_path = db_path
+        self.ttl_s = ttl_hours * 3600
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS places_cache ("
+                " term TEXT NOT NULL, cell TEXT NOT NULL, fetched_at REAL NOT NULL, results TEXT NOT NULL,"
+                " PRIMARY KEY (term, cell))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def _term_key(term):
+        return " ".join(term.split()).casefold()
+
+    def lookup(self, terms, cells):
+        """Teilt (Begriff, Zelle)-Paare in Treffer {Paar: Ergebnisse} und fehlende Paare auf."""
+        min_time = time.time() - self.ttl_s
+        hits, missing = {}, []
+        with self._connect() as conn:
+            for term in terms:
+                rows = dict(conn.execute(
+                    "SELECT cell, results FROM places_cache WHERE term = ? AND fetched_at >= ?",
+                    (self._term_key(term), min_time)
+                ).fetchall())
+                for cell in cells:
+                    if cell in rows:
+                        hits[(term, cell)] = json.loads(rows[cell])
+                    else:
+                        missing.append((term, cell))
+        return hits, missing
+
+    def fetch(self, client, missing):
+        """Lädt fehlende Paare parallel über den PlacesClient und speichert sie.
+
+        Gibt ({Paar: Ergebnisse}, Anzahl API-Aufrufe) zurück. Fehlgeschlagene
+        Abfragen werden nicht gecacht.
+        """
+        queries = [(*cell_query(cell), term) for term, cell in missing]
+        responses = client.search_many(queries)
+
+        fetched, api_calls, rows = {}, 0, []
+        now = time.time()
+        for (term, cell), response in zip(missing, responses):
+            api_calls += response.get("api_calls", 0)
+            if response.get("status") not in ("OK", "ZERO_RESULTS"):
+                continue
+            # Nur Ergebnisse innerhalb der Zelle behalten, damit jeder Ort genau einer Zelle gehört
+            bounds = cell_bounds(cell)
+            results = [place for place in response.get("results", []) if _in_cell(place, bounds)]
+            fetched[(term, cell)] = results
+            rows.append((self._term_key(term), cell, now, json.dumps(results)))
+
+        if rows:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO places_cache VALUES (?, ?, ?, ?)", rows)
+            # Die Tabelle wächst nur hier; abgelaufene Paare bei der Gelegenheit entfernen
+            self.purge_expired()
+        return fetched, api_calls
+
+    def purge_expired(self):
+        """Löscht abgelaufene Einträge; gibt deren Anzahl zurück."""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM places_cache WHERE fetched_at < ?",
+                                    (time.time() - self.ttl_s,)).rowcount
+        finally:
+            conn.close()
+
+
+def markets_in_radius(results_by_pair, terms, lat, lon, radius_m):
+    """Führt Zell-Ergebnisse je Suchbegriff zusammen und filtert auf den Suchradius."""
+    markets = []
+    for term in terms:
+        seen = set()
+        term_markets = []
+        for (pair_term, _), results in results_by_pair.items():
+            if pair_term != term:
+                continue
+            for place in results:
+                place_id = place.get("place_id")
+                if place_id in seen:
+                    continue
+                seen.add(place_id)
+                term_markets.append(dict(place, search_keyword=term))
+
+        markets.extend(m for m in term_markets
+                       if haversine_km(lat, lon, m["geometry"]["location"]["lat"],
+                                       m["geometry"]["location"]["lng"]) * 1000 <= radius_m)
+    return markets
@@ -0,0 +1,143 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PLACES_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+
+# API-Status, bei denen sich ein erneuter Versuch lohnt
+RETRY_STATUSES = {"UNKNOWN_ERROR", "OVER_QUERY_LIMIT"}
+RETRY_HTTP_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Einfacher thread-sicherer Ratenbegrenzer (Anfragen pro Sekunde)."""
+
+    def __init__(self, rate_per_s):
+        self.interval = 1.0 / rate_per_s if rate_per_s else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blockiert, bis die nächste Anfrage erlaubt ist."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_s = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_s > 0:
+            time.sleep(wait_s)
+
+
+class PlacesClient:
+    """Client für die Google Places Nearby Search.
+
+    Nutzt eine gepoolte HTTP-Session, folgt next_page_token, wiederholt
+    vorübergehende Fehler mit Backoff und begrenzt die Anfragerate. Über
+    base_url und session lässt sich ein lokaler Stub-Server einsetzen.
+    Eine Suche verbraucht inklusive Wiederholungen höchstens
+    max_calls_per_query Anfragen, damit Reservierungen nie überschritten werden.
+    """
+
+    def __init__(self, api_key, base_url=PLACES_URL, session=None, max_workers=8,
+                 rate_limit_per_s=10, timeout_s=10, max_pages=3, max_retries=3,
+                 backoff_s=1.0, page_token_delay_s=2.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout_s = timeout_s
+        self.max_pages = max_pages
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.page_token_delay_s = page_token_delay_s
+        self.rate_limiter = RateLimiter(rate_limit_per_s)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+    @property
+    def max_calls_per_query(self):
+        """Obergrenze der API-Anfragen je Suche (eine je Ergebnisseite, Wiederholungen eingerechnet)."""
+        return self.max_pages
+
+    def _request(self, params, page_token=False, max_attempts=None):
+        """Eine API-Anfrage mit Wiederholungen; gibt (Antwort, Anzahl Anfragen) zurück."""
+        calls = 0
+        data = {"status": "ERROR", "error": "Keine Anfrage durchgeführt"}
+
+        attempts = self.max_retries + 1
+        if max_attempts is not None:
+            attempts = min(attempts, max_attempts)
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.backoff_s * 2 ** (attempt - 1))
+
+            self.rate_limiter.wait()
+            calls += 1
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout_s)
+                if response.status_code in RETRY_HTTP_CODES:
+                    data = {"status": "ERROR", "error": f"HTTP {response.status_code}"}
+                    continue
+                response.raise_for_status()
+                data = response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                data = {"status": "ERROR", "error": str(e)}
+                continue
+            except Exception as e:
+                return {"status": "ERROR", "error": str(e)}, calls
+
+            status = data.get("status")
+            # Ein frisch ausgegebener Seiten-Token ist kurz ungültig
+            if status in RETRY_STATUSES or (page_token and status == "INVALID_REQUEST"):
+                continue
+            return data, calls
+
+        return data, calls
+
+    def nearby_search(self, lat, lng, radius, keyword):
+        """Sucht Märkte zu einem Suchbegriff inklusive aller Ergebnisseiten."""
+        params = {
+            "location": f"{lat},{lng}",
+            "radius": radius,
+            "keyword": keyword,
+            "type": "supermarket",
+            "key": self.api_key
+        }
+        budget = self.max_calls_per_query
+        data, api_calls = self._request(params, max_attempts=budget)
+        if data.get("status") != "OK":
+            return {**data, "api_calls": api_calls}
+
+        results = list(data.get("results", []))
+        next_token = data.get("next_page_token")
+        pages = 1
+        # Wiederholungen gehen zu Lasten weiterer Seiten
+        while next_token and pages < self.max_pages and api_calls < budget:
+            time.sleep(self.page_token_delay_s)
+            page, calls = self._request({"pagetoken": next_token, "key": self.api_key}, page_token=True,
+                                        max_attempts=budget - api_calls)
+            api_calls += calls
+            if page.get("status") != "OK":
+                break
+            results.extend(page.get("results", []))
+            next_token = page.get("next_page_token")
+            pages += 1
+
+        return {"status": "OK", "results": results, "api_calls": api_calls}
+
+    def search_many(self, queries):
+        """Führt mehrere Abfragen (lat, lng, radius, keyword) parallel aus; Ergebnisse in gleicher Reihenfolge."""
+        if not queries:
+            return []
+        workers = max(1, min(self.max_workers, len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.nearby_search, *query) for query in queries]
+            return [future.result() for future in futures]
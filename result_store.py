@@ -0,0 +1,112 @@
+import json
+import time
+import uuid
+import sqlite3
+
+# Markt-Spalten in der Reihenfolge der Tabelle
+MARKET_COLUMNS = ["name", "vicinity", "search_keyword", "lat", "lng", "direction", "distance_m", "rating"]
+# Textspalten, deren maximale Länge beim Speichern mitgeführt wird (für Spaltenbreiten im Export)
+TEXT_COLUMNS = ["name", "vicinity", "search_keyword", "direction"]
+
+
+class ResultStore:
+    """Serverseitiger Speicher für Analyse-Ergebnisse (SQLite).
+
+    Jede Analyse erhält eine Ergebnis-ID; die Session hält nur diese ID.
+    Die Märkte liegen zeilenweise in einer eigenen Tabelle, sodass Export und
+    Nachfilterung direkt per SQL erfolgen. Alte Ergebnisse werden nach TTL
+    bzw. über die Höchstanzahl hinaus verdrängt.
+    """
+
+    def __init__(self, db_path, ttl_hours=24, max_results=1000):
+        self.db_path = db_path
+        self.ttl_s = ttl_hours * 3600
+        self.max_results = max_results
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " id TEXT PRIMARY KEY, created_at REAL NOT NULL, params TEXT NOT NULL,"
+                " market_count INTEGER NOT NULL, max_lengths TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS markets ("
+                " result_id TEXT NOT NULL REFERENCES results (id) ON DELETE CASCADE,"
+                " name TEXT, vicinity TEXT, search_keyword TEXT, lat REAL, lng REAL,"
+                " direction TEXT, distance_m REAL, rating REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_markets_result ON markets (result_id)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def save(self, markets, params=None):
+        """Speichert die Märkte einer Analyse und gibt die neue Ergebnis-ID zurück."""
+        result_id = uuid.uuid4().hex
+        rows = [tuple(market.get(column) for column in MARKET_COLUMNS) for market in markets]
+        max_lengths = {column: max((len(str(market.get(column) or "")) for market in markets), default=0)
+                       for column in TEXT_COLUMNS}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?)",
+                (result_id, time.time(), json.dumps(params or {}), len(rows), json.dumps(max_lengths))
+            )
+            conn.executemany(
+                f"INSERT INTO markets VALUES (?, {', '.join('?' * len(MARKET_COLUMNS))})",
+                [(result_id, *row) for row in rows]
+            )
+        self.evict()
+        return result_id
+
+    def get(self, result_id):
+        """Gibt die Metadaten eines Ergebnisses zurück oder None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created_at, params, market_count, max_lengths FROM results"
+                " WHERE id = ? AND created_at >= ?",
+                (result_id, time.time() - self.ttl_s)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": result_id,
+            "created_at": row[0],
+            "params": json.loads(row[1]),
+            "market_count": row[2],
+            "max_lengths": json.loads(row[3])
+        }
+
+    def markets(self, result_id, search_keywords=None, directions=None, max_distance_m=None):
+        """Liefert die Märkte eines Ergebnisses als Liste von Dicts, optional gefiltert."""
+        return list(self.iter_markets(result_id, search_keywords, directions, max_distance_m))
+
+    def iter_markets(self, result_id, search_keywords=None, directions=None, max_distance_m=None):
+        """Liefert die Märkte zeilenweise aus der Datenbank (für Exporte mit konstantem Speicherbedarf)."""
+        query = f"SELECT {', '.join(MARKET_COLUMNS)} FROM markets WHERE result_id = ?"
+        args = [result_id]
+        if search_keywords:
+            query += f" AND search_keyword IN ({', '.join('?' * len(search_keywords))})"
+            args.extend(search_keywords)
+        if directions:
+            query += f" AND direction IN ({', '.join('?' * len(directions))})"
+            args.extend(directions)
+        if max_distance_m is not None:
+            query += " AND distance_m <= ?"
+            args.append(max_distance_m)
+        conn = self._connect()
+        try:
+            for row in conn.execute(query + " ORDER BY rowid", args):
+                yield dict(zip(MARKET_COLUMNS, row))
+        finally:
+            conn.close()
+
+    def evict(self):
+        """Entfernt abgelaufene Ergebnisse und die ältesten über der Höchstanzahl."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_s,))
+            conn.execute(
+                "DELETE FROM results WHERE id IN ("
+                " SELECT id FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_results,)
+            )
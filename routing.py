@@ -0,0 +1,25 @@
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+
+def csr_shortest_path_tree(csr, source, limit=np.inf):
+    """Kürzeste-Wege-Baum auf einem CSRGraph (kompilierte Dijkstra-Suche aus scipy).
+
+    Gibt (Distanzen, Vorgänger) als Arrays über alle Knoten-Indizes zurück;
+    nicht erreichte Knoten haben die Distanz inf und den Vorgänger -9999.
+    """
+    return dijkstra(csr.matrix(), directed=True, indices=source, return_predecessors=True, limit=limit)
+
+
+def csr_path_from_tree(predecessors, source, target):
+    """Liest den Pfad (Knoten-Indizes) vom Startknoten zum Ziel aus dem Vorgänger-Array."""
+    if target != source and predecessors[target] < 0:
+        return None
+
+    path = [target]
+    node = target
+    while node != source:
+        node = predecessors[node]
+        path.append(node)
+    path.reverse()
+    return np.array(path, dtype=np.int64)
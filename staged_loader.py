@@ -0,0 +1,49 @@
+import networkx as nx
+import osmnx as ox
+from shapely.geometry import Point, LineString, MultiLineString
+
+from exit_selection import junction_candidates, assign_sectors, nearest_per_sector
+from geometry import LocalProjection
+
+# Hauptstraßen-Ebene, die für den gesamten Radius geladen wird
+MAJOR_ROADS_FILTER = '["highway"~"motorway|motorway_link|trunk|trunk_link|primary|primary_link"]'
+
+
+def load_staged_graph(major_store, detail_store, lat, lon, circle_polygon, local_radius_km,
+                      corridor_width_m, highway_values, fallback_types, n_sectors=8):
+    """Lädt das Straßennetz gestaffelt statt vollständig für den ganzen Radius.
+
+    1. Hauptstraßen (motorway/trunk/primary) für den gesamten Kreis
+    2. Vollständiges drive-Netz im Nahbereich des Festivals
+    3. Vollständiges drive-Netz entlang der Luftlinien-Korridore zu den Kandidaten-Anschlussstellen
+
+    Die Teile werden unvereinfacht zusammengesetzt und erst danach vereinfacht,
+    damit die Übergänge zwischen den Ebenen erhalten bleiben.
+    """
+    major = major_store.graph_from_polygon(circle_polygon, layer="major",
+                                           custom_filter=MAJOR_ROADS_FILTER, simplify=False)
+
+    projection = LocalProjection(lat, lon)
+    local_polygon = projection.buffer_wgs(Point(lon, lat), local_radius_km * 1000).intersection(circle_polygon)
+    parts = [major, detail_store.graph_from_polygon(local_polygon, simplify=False, retain_all=True)]
+
+    # Kandidaten-Anschlussstellen bereits auf der Hauptstraßen-Ebene bestimmen
+    lons, lats, _ = junction_candidates(major, highway_values, fallback_types)
+    if len(lons):
+        dist_km, _, sectors = assign_sectors(lat, lon, lats, lons, n_sectors)
+        corridor_lines = [LineString([(lon, lat), (lons[i], lats[i])]) for i in nearest_per_sector(sectors, dist_km)]
+        corridor_polygon = projection.buffer_wgs(MultiLineString(corridor_lines), corridor_width_m)
+        corridor_polygon = corridor_polygon.difference(local_polygon).intersection(circle_polygon)
+        if not corridor_polygon.is_empty:
+            try:
+                parts.append(detail_store.graph_from_polygon(corridor_polygon, simplify=False, retain_all=True))
+            except ValueError:
+                pass
+
+    G = nx.compose_all(parts)
+    G.graph['crs'] = major.graph.get('crs', "EPSG:4326")
+    G.graph['simplified'] = False
+    G = ox.simplify_graph(G)
+
+    largest = max(nx.weakly_connected_components(G), key=len)
+    return G.subgraph(largest).copy()
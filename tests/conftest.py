@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Module liegen flach im Projektverzeichnis
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
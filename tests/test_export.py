@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("flask")
+
+
+@pytest.fixture
+def webapp(tmp_path, monkeypatch):
+    # Alle Speicher in ein temporäres Verzeichnis umleiten (vor dem Import der App)
+    for name in ("USAGE_DB", "PLACES_CACHE_DB", "GEOCODE_CACHE_DB", "RESULT_STORE_DB", "JOB_STORE_DB"):
+        monkeypatch.setenv(name, str(tmp_path / f"{name.lower()}.sqlite"))
+    monkeypatch.setenv("BATCH_OUTPUT_DIR", str(tmp_path / "batch_output"))
+    import app as webapp
+    return webapp
+
+
+def test_csv_export_sets_charset_once(webapp):
+    result_id = webapp.result_store.save([{
+        "name": "Markt", "vicinity": "Hauptstraße 5", "search_keyword": "Supermarkt",
+        "lat": 53.63, "lng": 11.41, "direction": "N", "distance_m": 120.0, "rating": 4.2
+    }])
+
+    response = webapp.app.test_client().get(f"/api/export_markets?format=csv&result_id={result_id}")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "text/csv; charset=utf-8"
+    assert "Hauptstraße 5" in response.get_data(as_text=True)
@@ -0,0 +1,21 @@
+from geocode_cache import GeocodeCache, normalize_address
+
+
+def test_normalize_folds_case_whitespace_and_umlauts():
+    assert normalize_address("  Schloßstraße 1,  Schwerin ") == "schlossstrasse 1 schwerin"
+    assert normalize_address("MÜHLENWEG 3") == "muehlenweg 3"
+
+
+def test_normalize_expands_abbreviated_street_names():
+    assert normalize_address("Hauptstr. 5") == "hauptstrasse 5"
+    assert normalize_address("Hauptstr.5, Kiel") == "hauptstrasse5 kiel"
+    assert normalize_address("Str. des Friedens 2") == "strasse des friedens 2"
+    assert normalize_address("Am Markt, Hauptstr.") == "am markt hauptstrasse"
+
+
+def test_abbreviated_address_hits_cache_entry(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    result = {"lat": 53.63, "lng": 11.41, "formatted_address": "Hauptstraße 5, Schwerin", "status": "OK"}
+    cache.put("Hauptstraße 5, Schwerin", result)
+
+    assert cache.get("hauptstr. 5 schwerin")["lat"] == 53.63
@@ -0,0 +1,45 @@
+import random
+import sqlite3
+
+from places_cache import PlacesCache, cells_for_circle, cell_query, PLACES_MAX_RADIUS_M
+
+
+def _cell_counts(radius_km, n=200):
+    rng = random.Random(0)
+    return [len(cells_for_circle(47 + 8 * rng.random(), 6 + 9 * rng.random(), radius_km * 1000))
+            for _ in range(n)]
+
+
+def test_cold_run_costs_few_cells_per_term():
+    # Bis 25 km höchstens 4 Zellen je Suchbegriff, im Mittel unter 3
+    for radius_km in (2, 5, 10, 20, 25):
+        counts = _cell_counts(radius_km)
+        assert max(counts) <= 4
+        assert sum(counts) / len(counts) < 3
+
+
+def test_large_radius_cost_is_bounded():
+    # Größer als die größte Stufe: Kosten wachsen mit der Fläche, bleiben aber begrenzt
+    assert max(_cell_counts(40)) <= 9
+    assert max(_cell_counts(100)) <= 20
+
+
+def test_cell_query_covers_cell_within_places_limit():
+    for cell in cells_for_circle(53.36, 11.60, 100000):
+        _, _, radius_m = cell_query(cell)
+        assert radius_m <= PLACES_MAX_RADIUS_M
+
+
+def test_purge_expired_removes_old_rows(tmp_path):
+    db_path = str(tmp_path / "places.sqlite")
+    cache = PlacesCache(db_path, ttl_hours=1)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany("INSERT INTO places_cache VALUES (?, ?, ?, ?)",
+                         [("supermarkt", "0.3:1:1", 0.0, "[]"), ("supermarkt", "0.3:1:2", 1e12, "[]")])
+    conn.close()
+
+    assert cache.purge_expired() == 1
+    hits, missing = cache.lookup(["supermarkt"], ["0.3:1:1", "0.3:1:2"])
+    assert list(hits) == [("supermarkt", "0.3:1:2")]
+    assert missing == [("supermarkt", "0.3:1:1")]
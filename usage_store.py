@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import sqlite3
+from datetime import datetime
+
+
+def current_month():
+    return datetime.now().strftime("%Y-%m")
+
+
+class UsageStore:
+    """Prozessübergreifender API-Nutzungszähler auf SQLite-Basis.
+
+    Kontingente werden vor einem API-Aufruf atomar reserviert (BEGIN IMMEDIATE)
+    und danach mit der tatsächlichen Anzahl verbucht. Zählerstände gelten je
+    Kalendermonat.
+    """
+
+    def __init__(self, db_path, limits, reservation_ttl_s=600, legacy_file=None):
+        self.db_path = db_path
+        self.limits = limits
+        self.reservation_ttl_s = reservation_ttl_s
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_usage ("
+                " month TEXT NOT NULL, api_type TEXT NOT NULL, used INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (month, api_type))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_reservations ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, month TEXT NOT NULL, api_type TEXT NOT NULL,"
+                " count INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+        if legacy_file:
+            self._migrate(legacy_file)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _migrate(self, legacy_file):
+        """Übernimmt einmalig die Zählerstände aus der alten JSON-Datei."""
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                usage_data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT COUNT(*) FROM api_usage").fetchone()[0] == 0:
+                conn.executemany(
+                    "INSERT INTO api_usage (month, api_type, used) VALUES (?, ?, ?)",
+                    [(month, api_type, int(used))
+                     for month, counts in usage_data.items() for api_type, used in counts.items()]
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+
+    def _usage(self, conn, month, api_type):
+        """Verbrauch plus aktive Reservierungen eines Monats."""
+        used = conn.execute(
+            "SELECT used FROM api_usage WHERE month = ? AND api_type = ?", (month, api_type)
+        ).fetchone()
+        reserved = conn.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM api_reservations"
+            " WHERE month = ? AND api_type = ? AND created_at >= ?",
+            (month, api_type, time.time() - self.reservation_ttl_s)
+        ).fetchone()[0]
+        return (used[0] if used else 0) + reserved
+
+    def check(self, api_type, requests_needed=1):
+        """Prüft das Kontingent: (ok, aktuelle Nutzung, verbleibend)."""
+        if api_type not in self.limits:
+            return False, 0, 0
+        conn = self._connect()
+        try:
+            current_usage = self._usage(conn, current_month(), api_type)
+        finally:
+            conn.close()
+        remaining = self.limits[api_type] - current_usage
+        return current_usage + requests_needed <= self.limits[api_type], current_usage, remaining
+
+    def reserve(self, api_type, count):
+        """Reserviert atomar count Anfragen; gibt eine Reservierungs-ID oder None (Limit) zurück."""
+        if api_type not in self.limits:
+            return None
+        month = current_month()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Verwaiste Reservierungen (z.B. nach abgebrochenen Workern) zählen nicht mehr und werden entfernt
+            conn.execute("DELETE FROM api_reservations WHERE created_at < ?",
+                         (time.time() - self.reservation_ttl_s,))
+            if self._usage(conn, month, api_type) + count > self.limits[api_type]:
+                conn.execute("ROLLBACK")
+                return None
+            reservation_id = conn.execute(
+                "INSERT INTO api_reservations (month, api_type, count, created_at) VALUES (?, ?, ?, ?)",
+                (month, api_type, count, time.time())
+            ).lastrowid
+            conn.execute("COMMIT")
+            return reservation_id
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def commit(self, reservation_id, used):
+        """Löst eine Reservierung auf und verbucht die tatsächlich genutzten Anfragen."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT month, api_type FROM api_reservations WHERE id = ?", (reservation_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM api_reservations WHERE id = ?", (reservation_id,))
+                if used:
+                    self._add(conn, row[0], row[1], used)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _add(self, conn, month, api_type, count):
+        conn.execute(
+            "INSERT INTO api_usage (month, api_type, used) VALUES (?, ?, ?)"
+            " ON CONFLICT (month, api_type) DO UPDATE SET used = used + excluded.used",
+            (month, api_type, count)
+        )
+
+    def month_usage(self, month=None):
+        """Gibt {API-Typ: Nutzung} eines Monats inkl. Reservierungen zurück."""
+        month = month or current_month()
+        conn = self._connect()
+        try:
+            return {api_type: self._usage(conn, month, api_type) for api_type in self.limits}
+        finally:
+            conn.close()
@@ -0,0 +1,14 @@
+"""Produktions-Einstiegspunkt: gunicorn -c gunicorn.conf.py wsgi:app
+
+Mit preload_app lädt der Master den Geo-Stack einmal vor dem Forken; die
+Worker teilen diese Speicherseiten per Copy-on-Write.
+"""
+import gc
+
+from app import app, warm_up
+
+warm_up()
+
+# Bisher angelegte Objekte von der Garbage Collection ausnehmen, damit die
+# Worker die geteilten Seiten nicht durch GC-Läufe kopieren
+gc.freeze()